@@ -0,0 +1,107 @@
+"""
+Benchmarks the assessment merger's reshape against the original melt and
+pivot_table implementation.
+
+Generates synthetic standardized assessment exports (one CSV per patient,
+questions by assessment dates) and merges one assessment type with the
+original code, then with the current code serially and with a process pool
+for every CSV engine. Every merged table is checked to be identical to the
+original one, and every merge is timed. With --memory-budget-mb, the
+chunked merge is also checked to write the same CSV as the in-memory merge,
+and the peak memory of both is traced.
+
+    python benchmarks/bench_assessment_merger.py --patients 1000 --dates 24 --workers 4
+"""
+import argparse
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from glob import glob
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "data_wrangling"))
+
+import pandas as pd
+from assessment_merger import CSV_ENGINES, fixed_columns, read_exports, combine_exports, process_assessment_csvs
+from synthetic_casefiles import make_assessment_exports
+
+
+def legacy_merge(csv_files):
+    """The melt, concat and pivot_table reshape the merger used to run."""
+    df_list = []
+    for file_path in csv_files:
+        df = pd.read_csv(file_path)
+        df['file_name'] = os.path.basename(file_path)
+        date_columns = [col for col in df.columns if col not in fixed_columns + ['file_name']]
+        df_list.append(df.melt(id_vars=fixed_columns + ['file_name'], value_vars=date_columns,
+                               var_name='assessment_date', value_name='response'))
+    df_combined = pd.concat(df_list, ignore_index=True)
+    df_final = df_combined.pivot_table(index=['file_name', 'assessment_date'], columns='question',
+                                       values='response', aggfunc='first').reset_index()
+    df_final.columns.name = None
+    return df_final
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--patients", type=int, default=1000, help="export files per assessment type")
+    arg_parser.add_argument("--dates", type=int, default=12, help="most assessment dates per export")
+    arg_parser.add_argument("--assessment", default="DERS", help="assessment type to merge")
+    arg_parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "exist_benchmarks"),
+                            help="folder for the generated exports")
+    arg_parser.add_argument("--memory-budget-mb", type=float, default=None,
+                            help="also run the chunked merge with this memory budget")
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes for the pooled runs")
+    args = arg_parser.parse_args()
+
+    root = os.path.join(args.work_dir, f"merger-patients{args.patients}-dates{args.dates}")
+    if not os.path.exists(os.path.join(root, "done")):
+        print(f"Generating synthetic exports in {root}", flush=True)
+        make_assessment_exports(root, args.patients, assessments_per_patient=args.dates)
+        open(os.path.join(root, "done"), "w").close()
+    csv_files = glob(os.path.join(root, args.assessment, "*.csv"))
+
+    start = time.perf_counter()
+    legacy = legacy_merge(csv_files)
+    legacy_seconds = time.perf_counter() - start
+
+    print(f"melt + pivot_table{'':<14}{legacy_seconds:8.3f}s", flush=True)
+
+    for engine in CSV_ENGINES:
+        if engine == "pyarrow" and importlib.util.find_spec("pyarrow") is None:
+            print("pyarrow is not installed, skipping the pyarrow engine")
+            continue
+        for workers in sorted({1, args.workers}):
+            start = time.perf_counter()
+            merged = combine_exports(csv_files, read_exports(csv_files, workers, engine))
+            seconds = time.perf_counter() - start
+            pd.testing.assert_frame_equal(legacy, merged)
+            name = f"{engine} engine, {workers} worker{'s' if workers > 1 else ''}"
+            print(f"{name:<32}{seconds:8.3f}s  ({legacy_seconds / seconds:.1f}x)", flush=True)
+
+    if args.memory_budget_mb:
+        folder = os.path.join(root, args.assessment)
+        peaks, outputs = {}, {}
+        for name, budget in (("in memory", None), (f"chunked, {args.memory_budget_mb:g} MB budget", args.memory_budget_mb)):
+            out_folder = tempfile.mkdtemp(dir=args.work_dir)
+            tracemalloc.start()
+            start = time.perf_counter()
+            out_file = process_assessment_csvs(folder, out_folder, args.assessment, memory_budget_mb=budget)
+            seconds = time.perf_counter() - start
+            peaks[name] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+            with open(out_file) as f:
+                outputs[name] = f.read()
+            shutil.rmtree(out_folder)
+            print(f"{name:<32}{seconds:8.3f}s  peak {peaks[name]:.1f} MB (traced)", flush=True)
+        assert len(set(outputs.values())) == 1, "the chunked merge wrote a different CSV"
+
+    print(f"{len(csv_files)} {args.assessment} exports, {len(merged)} merged rows x {merged.shape[1]} columns, "
+          f"all outputs identical")
+
+if __name__ == "__main__":
+    main()
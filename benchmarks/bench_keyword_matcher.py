@@ -0,0 +1,86 @@
+"""
+Benchmarks the PHP keyword matcher against the original per-word regex checks.
+
+Builds a synthetic corpus of assessment texts mixing filler words with the
+emotion, skill and support keywords (in varied case, and with phrases that
+overlap such as "opposite action"), checks that both implementations report
+the same categories and matched words for every text, and times them.
+
+    python benchmarks/bench_keyword_matcher.py --texts 20000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pdf_parsers", "parser_app"))
+from exist_pdf_parsers import emotion_keywords, skills_keywords, supports_keywords, php_keyword_matcher
+
+FILLER = ("today I felt the group was okay and we talked about my week at home with family "
+          "then went outside walked around had lunch spoke to staff about plans for tomorrow").split()
+
+
+def legacy_check(keywords, text):
+    """The per-keyword implementation the matcher replaced."""
+    found_categories = {}
+    matched_words = []
+    for category, words in keywords.items():
+        found = [word for word in words if re.search(rf"\b{word}\b", text, re.IGNORECASE)]
+        found_categories[category] = bool(found)
+        matched_words.extend(found)
+    return found_categories, set(matched_words)
+
+
+def make_corpus(n_texts, words_per_text, seed):
+    rnd = random.Random(seed)
+    keywords = [word for d in (emotion_keywords, skills_keywords, supports_keywords)
+                for words in d.values() for word in words]
+    corpus = []
+    for _ in range(n_texts):
+        tokens = []
+        for _ in range(words_per_text):
+            if rnd.random() < 0.05:
+                word = rnd.choice(keywords)
+                word = rnd.choice([word, word.upper(), word.title(), word + "s", "un" + word])
+            else:
+                word = rnd.choice(FILLER)
+            tokens.append(word + rnd.choice(["", "", "", ",", ".", "\n"]))
+        corpus.append(" ".join(tokens))
+    return corpus
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--texts", type=int, default=5000)
+    arg_parser.add_argument("--words", type=int, default=200)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    corpus = make_corpus(args.texts, args.words, args.seed)
+    dictionaries = {"emotions": emotion_keywords, "skills": skills_keywords, "supports": supports_keywords}
+
+    start = time.perf_counter()
+    legacy = [{name: legacy_check(keywords, text) for name, keywords in dictionaries.items()} for text in corpus]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = [php_keyword_matcher.match(text) for text in corpus]
+    compiled_seconds = time.perf_counter() - start
+
+    for text, old, new in zip(corpus, legacy, compiled):
+        for name in dictionaries:
+            old_hits, old_words = old[name]
+            new_hits, new_words = new[name]
+            new_words = set(new_words.split(", ")) if new_words else set()
+            if old_hits != new_hits or old_words != new_words:
+                raise AssertionError(f"{name} mismatch on text: {text[:200]!r}")
+
+    print(f"{args.texts} texts x {args.words} words, outputs identical")
+    print(f"per-word regex checks: {legacy_seconds:.3f}s")
+    print(f"compiled matcher:      {compiled_seconds:.3f}s ({legacy_seconds / compiled_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
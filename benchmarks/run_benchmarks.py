@@ -0,0 +1,177 @@
+"""
+Times the PDF parsers, the assessment merger and the statistical dataset
+builder on synthetic inputs, and records the results.
+
+Inputs are generated with synthetic_casefiles.py into a work folder (and
+reused on later runs with the same scale). Every process_* function is timed
+serially and with a process pool, the combined single-pass run_parsers is
+timed over all five parsers, and the merger and builder are run over the
+synthetic assessment exports. Each run is appended as one JSON line to the
+results file (benchmarks/results.jsonl by default, which git ignores, since
+timings belong to the machine they were taken on) and compared with the
+last recorded run at the same scale, so regressions show up between versions.
+
+    python benchmarks/run_benchmarks.py --files 100 --php-days 10 --workers 4
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "pdf_parsers", "parser_app"))
+sys.path.insert(0, os.path.join(REPO_DIR, "data_wrangling"))
+
+import pandas as pd
+import exist_pdf_parsers as parsers
+import assessment_merger
+import statistical_dataset_builder
+from parse_timing import RunTimings
+from synthetic_casefiles import make_casefiles, make_assessment_exports
+
+# Local to each machine and kept out of git
+DEFAULT_RESULTS = os.path.join(BENCH_DIR, "results.jsonl")
+
+PROCESS_FUNCTIONS = {
+    "CARD": parsers.process_clinical_card_pdfs,
+    "PHP": parsers.process_php_pdfs,
+    "BPS": parsers.process_bps_pdfs,
+    "SUB": parsers.process_substance_history,
+    "AHCM": parsers.process_ahcm_pdfs,
+}
+
+
+def prepare_inputs(work_dir, scale):
+    """Generates the synthetic inputs once per scale and returns their folders."""
+    scale_name = "files{files}-php{php_days}-cards{cards}-notes{note_pages}-patients{patients}".format(**scale)
+    root = os.path.join(work_dir, scale_name)
+    casefiles = os.path.join(root, "casefiles")
+    assessments = os.path.join(root, "assessments")
+    if not os.path.exists(os.path.join(root, "done")):
+        print(f"Generating synthetic inputs in {root}", flush=True)
+        make_casefiles(casefiles, scale["files"], scale["php_days"], scale["cards"], scale["note_pages"])
+        make_assessment_exports(assessments, scale["patients"])
+        open(os.path.join(root, "done"), "w").close()
+    return root, casefiles, assessments
+
+
+def timed_run(name, results, func, *args, **kwargs):
+    # Keep the parsers' per-file progress prints out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        value = func(*args, **kwargs)
+    results[name] = round(time.perf_counter() - start, 4)
+    print(f"{name:<28}{results[name]:>10.3f}s", flush=True)
+    return value
+
+
+def run_builder(merged_folder, clinical_path, output_folder):
+    builder = statistical_dataset_builder
+    datasets = builder.build_statistical_datasets(builder.load_merged_assessments(merged_folder), clinical_path)
+    builder.write_statistical_datasets(datasets, output_folder)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_run(results_file, scale):
+    if not os.path.exists(results_file):
+        return None
+    last = None
+    with open(results_file, "r") as f:
+        for line in f:
+            run = json.loads(line)
+            if run.get("scale") == scale:
+                last = run
+    return last
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--files", type=int, default=20, help="number of synthetic casefile PDFs")
+    arg_parser.add_argument("--php-days", type=int, default=5, help="PHP daily assessments per casefile")
+    arg_parser.add_argument("--cards", type=int, default=1, help="Daily Clinical Cards per casefile")
+    arg_parser.add_argument("--note-pages", type=int, default=2, help="pages of progress notes per casefile")
+    arg_parser.add_argument("--patients", type=int, default=None,
+                            help="patients in the assessment exports (default: --files)")
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes for the pooled runs")
+    arg_parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "exist_benchmarks"),
+                            help="folder for generated inputs and outputs")
+    arg_parser.add_argument("--results", default=DEFAULT_RESULTS, help="JSON lines file the run is appended to")
+    arg_parser.add_argument("--no-record", action="store_true", help="print the results without recording them")
+    args = arg_parser.parse_args()
+    # Time the parsers with the logging the command line runs them with
+    parsers.setup_logging()
+
+    scale = {"files": args.files, "php_days": args.php_days, "cards": args.cards,
+             "note_pages": args.note_pages, "patients": args.patients or args.files}
+    root, casefiles, assessments = prepare_inputs(args.work_dir, scale)
+    output_folder = os.path.join(root, "output")
+    os.makedirs(output_folder, exist_ok=True)
+
+    results = {}
+    stages = {}
+    for parser_type, process in PROCESS_FUNCTIONS.items():
+        timed_run(f"{parser_type} serial", results, process, casefiles, workers=1)
+        timings = RunTimings()
+        timed_run(f"{parser_type} {args.workers} workers", results, process, casefiles,
+                  workers=args.workers, timings=timings)
+        stages[parser_type] = {name: round(sum(trace["stages"].get(name, 0.0) for trace in timings.files), 4)
+                               for name in timings.stage_names()}
+
+    timed_run(f"all parsers {args.workers} workers", results, parsers.run_parsers,
+              list(parsers.PARSERS), [casefiles], output_folder, workers=args.workers)
+
+    merged_folder = os.path.join(output_folder, "merged")
+    os.makedirs(merged_folder, exist_ok=True)
+    start = time.perf_counter()
+    for assessment in ["WHO", "GAD", "PHQ", "PTSD", "DERS", "DERS2"]:
+        timed_run(f"merge {assessment}", results, assessment_merger.process_assessment_csvs,
+                  os.path.join(assessments, assessment), merged_folder, assessment, workers=args.workers)
+    results["merge all"] = round(time.perf_counter() - start, 4)
+    timed_run("merge all one pass", results, assessment_merger.process_all_assessment_csvs,
+              assessments, merged_folder, workers=args.workers)
+    timed_run("build statistical dataset", results, run_builder, merged_folder,
+              os.path.join(assessments, "clinical_data_report.csv"), output_folder)
+
+    run = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "cpus": os.cpu_count(),
+        "workers": args.workers,
+        "scale": scale,
+        "seconds": results,
+        "parse_stages": stages,
+    }
+
+    previous = previous_run(args.results, scale)
+    if previous:
+        print(f"\nCompared with {previous.get('commit')} ({previous['timestamp']}):")
+        for name, seconds in results.items():
+            before = previous["seconds"].get(name)
+            if before:
+                print(f"{name:<28}{before:>10.3f}s -> {seconds:>8.3f}s  ({(seconds - before) / before:+.0%})")
+
+    if not args.no_record:
+        with open(args.results, "a") as f:
+            f.write(json.dumps(run) + "\n")
+        print(f"\nResults recorded in {args.results}")
+
+
+if __name__ == "__main__":
+    main()
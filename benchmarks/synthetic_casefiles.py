@@ -0,0 +1,268 @@
+"""
+Generates synthetic Kipu-style inputs for benchmarking, with no patient data.
+
+Partial casefile PDFs carry every section the PDF parsers look for: Daily
+Clinical Card rating tables, PHP Daily Assessment notes (some running across
+a page break), the Biopsychosocial "JUDGMENT:" score block, the section IV
+substance use table and the AHCM screening questions, padded with pages of
+progress notes. Standardized assessment CSV exports and a clinical data
+report are generated for the merger and the statistical dataset builder.
+
+    python benchmarks/synthetic_casefiles.py --out /tmp/synthetic --files 200 --php-days 20
+"""
+import argparse
+import os
+import random
+import textwrap
+import fitz
+import pandas as pd
+
+PAGE_BOTTOM = 780
+
+EMOTIONS = ["Sad", "Joy", "Fear", "Anger", "Shame", "Content", "Pain"]
+SUPPORTS = ["Sleep", "Water", "Nutrition", "Exercise", "Fun"]
+COPING = ["Values", "Meds", "Mindfulness", "Help"]
+
+PHP_PHRASES = [
+    "Today I felt sad and anxious, with some pain in my back.",
+    "I used mindfulness and opposite action when the urge came up.",
+    "I asked for help from staff and made sure to take my meds.",
+    "Felt joy and content after group, some fear about going home.",
+    "Slept well, drank water, therapy and exercise helped a lot.",
+    "Feeling lonely and worried, spoke to my sponsor about it.",
+    "Angry at first then used distress tolerance and played the tape through.",
+]
+NOTE_PHRASES = [
+    "Client attended group and participated appropriately.",
+    "Discussed coping strategies and relapse prevention planning.",
+    "Client reported stable mood and denied safety concerns.",
+    "Reviewed medication schedule with nursing staff.",
+    "Plan: continue current level of care and reassess next week.",
+]
+SUBSTANCES = [
+    ("Alcohol", "oral", ["continued", "Binge", "social", "Daily", "episodic"]),
+    ("Cannabis", "smoke", ["experimental", "Weekly", "continued", "daily use"]),
+    ("Cocaine", "nasal", ["episodic", "Binge", "remission"]),
+    ("Opioids", "oral", ["Daily", "continued", "prescribed"]),
+    ("Methamphetamine", "smoke", ["Binge", "weekends", "experimental"]),
+]
+AHCM_QUESTIONS = [
+    ("What is your living situation today?", ["I have a steady place to live", "I have a place to live today, but I am worried about losing it in the future"]),
+    ("How often does anyone, including family and friends, physically hurt you?", ["Never (1)", "Rarely (2)", "Sometimes (3)"]),
+    ("How often does anyone, including family and friends, insult or talk down to you?", ["Never (1)", "Sometimes (3)", "Fairly often (4)"]),
+    ("How hard is it for you to pay for the very basics like food, housing, medical care, and heating?", ["Would you say it is: Somewhat hard", "Not hard at all", "Very hard"]),
+    ("Do you want help finding or keeping work or a job?", ["Yes, help finding work", "I do not need or want help"]),
+    ("How often do you feel lonely or isolated from those around you?", ["Never", "Sometimes", "Often"]),
+    ("Do you speak a language other than English at home?", ["Yes", "No"]),
+    ("In the last 30 days, other than the activities you did for work, on average, how many days per week did you engage in moderate exercise (like walking fast, running, jogging, dancing, swimming, biking, or other similar activities)?", ["2 days", "0 days", "5 days"]),
+    ("On average, how many minutes did you usually spend exercising at this level on one of those days?", ["30 minutes", "0 minutes", "60 minutes", "150 minutes or more"]),
+    ("How many times in the past 12 months have you used tobacco products (like cigarettes, cigars, snuff, chew, electronic cigarettes)?", ["Never", "Once or Twice", "Daily or Almost Daily"]),
+    ("How many times in the past year have you used illegal drugs?", ["Never", "Monthly", "Weekly"]),
+]
+
+# Standardized assessments: item count, and the DERS legacy items exported as "'-N"
+ASSESSMENT_ITEMS = {"WHO": 5, "GAD": 7, "PHQ": 9, "PTSD": 20, "DERS": 36, "DERS2": 36}
+DERS2_REVERSED = [1, 2, 6, 7, 8, 10, 17, 20, 22, 24, 34]
+GAD_RESTLESS = ["5. * Being so restless that it is too hard to sit still",
+                "5. * Being so restless that it’s hard to sit still"]
+
+
+class PageWriter:
+    """Writes wrapped lines of text and ruled tables, starting new pages as needed."""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.new_page()
+
+    def new_page(self):
+        self.page = self.doc.new_page()
+        self.y = 60
+
+    def lines(self, text, fontsize=9, width=100):
+        for paragraph in text.split("\n"):
+            for line in textwrap.wrap(paragraph, width) or [""]:
+                if self.y > PAGE_BOTTOM:
+                    self.new_page()
+                self.page.insert_text((40, self.y), line, fontsize=fontsize)
+                self.y += fontsize + 4
+
+    def table(self, rows, col_width=70, row_height=30, fontsize=8):
+        if self.y + len(rows) * row_height > PAGE_BOTTOM:
+            self.new_page()
+        self.y += 10
+        for r, row in enumerate(rows):
+            for c, cell in enumerate(row):
+                rect = fitz.Rect(40 + c * col_width, self.y + r * row_height,
+                                 40 + (c + 1) * col_width, self.y + (r + 1) * row_height)
+                self.page.draw_rect(rect, color=(0, 0, 0), width=0.8)
+                self.page.insert_textbox(rect + (2, 2, -2, -2), str(cell), fontsize=fontsize)
+        self.y += len(rows) * row_height + 20
+
+
+def synthetic_date(rnd, day_offset):
+    month = 1 + (day_offset // 28) % 12
+    return f"{month:02d}/{1 + day_offset % 28:02d}/2024"
+
+
+def write_clinical_card(writer, rnd, date):
+    writer.new_page()
+    writer.lines(f"Daily Clinical Card {date}")
+    for label, names in (("Emotion", EMOTIONS), ("Support", SUPPORTS), ("Coping", COPING)):
+        writer.table([[label] + names, ["Rating"] + [rnd.randint(0, 5) for _ in names]])
+
+
+def write_php_assessment(writer, rnd, date, split_page):
+    writer.lines(f"PHP Daily Assessment {date} 09:{rnd.randint(10, 59)} AM")
+    writer.lines(" ".join(rnd.sample(PHP_PHRASES, 3)))
+    if split_page:
+        writer.new_page()
+    writer.lines(f"Cravings/impulse rating: {rnd.randint(0, 10)}/10")
+    writer.lines(" ".join(rnd.sample(PHP_PHRASES, 2)))
+    writer.lines("Jane Smith, ACSW1234")
+    writer.y += 10
+
+
+def write_substance_history(writer, rnd):
+    writer.new_page()
+    writer.lines("IV. SUBSTANCE USE HISTORY & ASSESSMENT")
+    rows = [["Substance", "First Use", "Last Use", "Frequency", "Amount", "Method", "Pattern"]]
+    for name, method, patterns in rnd.sample(SUBSTANCES, rnd.randint(2, len(SUBSTANCES))):
+        used = rnd.random() < 0.8
+        rows.append([name, f"age {rnd.randint(12, 25)}" if used else "", "2024" if used else "",
+                     rnd.choice(["daily", "weekly", ""]), rnd.randint(1, 8) if used else "",
+                     method, rnd.choice(patterns) if used else ""])
+    writer.table(rows, col_width=75)
+    writer.new_page()
+    writer.lines("V. MENTAL HEALTH HISTORY")
+    writer.lines(" ".join(rnd.sample(NOTE_PHRASES, 3)))
+
+
+def write_bps_scores(writer, rnd, date):
+    writer.new_page()
+    writer.lines(f"Biopsychosocial Assessment {date}")
+    writer.lines("List Drugs of Choice: alcohol, cannabis")
+    writer.lines(f"Number of Times: {rnd.randint(0, 6)}")
+    writer.lines(f"Drug craving (Range 0-10, 10 being highest) {rnd.randint(0, 10)}/10")
+    writer.lines("X. TREATMENT ACCEPTANCE / RESISTANCE DIMENSION")
+    writer.lines(rnd.choice(["My family wants me here", "The court requires it", "My job asked me to come"]))
+    writer.lines(rnd.choice(["I want to get better", "I want my life back", "I am tired of feeling this way"]))
+    writer.lines("3. Relapse/Continued Use Potential")
+    # Problem count, the seven dimension scores, then the total
+    scores = [rnd.randint(0, 4) for _ in range(7)]
+    writer.lines("JUDGMENT:")
+    writer.lines(" ".join(f"({score})" for score in [rnd.randint(0, 7)] + scores) + f" total ({sum(scores)})")
+    writer.lines("List Problems Identified in Bio-Psychosocial:")
+
+
+def write_ahcm(writer, rnd):
+    writer.new_page()
+    writer.lines("Who should use the AHC HRSN Screening Tool?")
+    writer.lines("Living Situation")
+    for number, (question, answers) in enumerate(AHCM_QUESTIONS, start=1):
+        writer.lines(f"{number}. {question}")
+        writer.lines(rnd.choice(answers))
+    writer.lines("27. Is there anything else?")
+    writer.lines("Not part of the screening")
+
+
+def make_casefile(path, seed, php_days=5, cards=1, note_pages=2):
+    """Writes one synthetic partial casefile PDF."""
+    rnd = random.Random(seed)
+    doc = fitz.open()
+    writer = PageWriter(doc)
+    admit_day = rnd.randint(0, 200)
+    writer.lines(f"Partial casefile\nBirthdate: {rnd.randint(1, 12):02d}/{rnd.randint(1, 28):02d}/{rnd.randint(1960, 2004)}")
+    writer.lines(f"Biopsychosocial Assessment {synthetic_date(rnd, admit_day)}")
+
+    write_bps_scores(writer, rnd, synthetic_date(rnd, admit_day))
+    write_substance_history(writer, rnd)
+    for card in range(cards):
+        write_clinical_card(writer, rnd, synthetic_date(rnd, admit_day + card))
+
+    writer.new_page()
+    for day in range(php_days):
+        write_php_assessment(writer, rnd, synthetic_date(rnd, admit_day + day), split_page=day % 4 == 1)
+
+    for _ in range(note_pages):
+        writer.new_page()
+        for _ in range(40):
+            writer.lines(rnd.choice(NOTE_PHRASES))
+
+    write_ahcm(writer, rnd)
+    doc.save(path)
+    doc.close()
+
+
+def make_casefiles(out_folder, files, php_days=5, cards=1, note_pages=2, seed=0):
+    os.makedirs(out_folder, exist_ok=True)
+    paths = []
+    for i in range(files):
+        path = os.path.join(out_folder, f"partial_casefile_LO-2024-{i}_synthetic.pdf")
+        make_casefile(path, seed * 100003 + i, php_days, cards, note_pages)
+        paths.append(path)
+    return paths
+
+
+def make_assessment_exports(out_folder, patients, assessments_per_patient=4, seed=0):
+    """
+    Writes one Kipu-style CSV export per patient and assessment type into
+    out_folder/<TYPE>/, plus a clinical_data_report.csv for the builder.
+    Returns {assessment type: folder}.
+    """
+    rnd = random.Random(seed)
+    folders = {}
+    for assessment, n_items in ASSESSMENT_ITEMS.items():
+        folder = os.path.join(out_folder, assessment)
+        os.makedirs(folder, exist_ok=True)
+        folders[assessment] = folder
+        for patient in range(patients):
+            dates = list(dict.fromkeys(
+                f"{synthetic_date(rnd, rnd.randint(0, 300))} {rnd.randint(1, 12)}:{rnd.randint(0, 59):02d} "
+                f"{rnd.choice(['AM', 'PM'])}" for _ in range(rnd.randint(1, assessments_per_patient))))
+            rows = []
+            for item in range(1, n_items + 1):
+                question = f"{item}. Synthetic {assessment} item {item}"
+                if assessment == "GAD" and item == 5:
+                    question = GAD_RESTLESS[patient % 2]
+                row = {"question": question, "code": f"{assessment}{item}", "issue": "", "issue_code": ""}
+                for date in dates:
+                    if assessment == "DERS2" and item in DERS2_REVERSED:
+                        row[date] = f"'-{rnd.randint(1, 5)}"
+                    else:
+                        row[date] = rnd.randint(0, 4)
+                rows.append(row)
+            pd.DataFrame(rows).to_csv(os.path.join(folder, f"{assessment}_LO-2024-{patient}_export.csv"), index=False)
+
+    programs = ["Mental Health PHP", "Mental Health IOP", "Substance Use PHP", "Substance Use IOP"]
+    discharges = ["Treatment Complete - Successful Discharge", "ATA - Unsuccessful Discharge",
+                  "Administrative Discharge - Involuntary Discharge"]
+    pd.DataFrame({
+        "MR": [f"LO-2024-{patient}" for patient in range(patients)],
+        "Admission Date": [synthetic_date(rnd, rnd.randint(0, 100)) for _ in range(patients)],
+        "Discharge Date": [synthetic_date(rnd, rnd.randint(100, 300)) for _ in range(patients)],
+        "Program": [rnd.choice(programs) for _ in range(patients)],
+        "Discharge Type": [rnd.choice(discharges) for _ in range(patients)],
+    }).to_csv(os.path.join(out_folder, "clinical_data_report.csv"), index=False)
+    return folders
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--out", required=True, help="folder to write casefiles/ and assessments/ to")
+    arg_parser.add_argument("--files", type=int, default=50, help="number of casefile PDFs")
+    arg_parser.add_argument("--php-days", type=int, default=5, help="PHP daily assessments per casefile")
+    arg_parser.add_argument("--cards", type=int, default=1, help="Daily Clinical Cards per casefile")
+    arg_parser.add_argument("--note-pages", type=int, default=2, help="pages of progress notes per casefile")
+    arg_parser.add_argument("--patients", type=int, default=None,
+                            help="patients in the assessment exports (default: --files)")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    make_casefiles(os.path.join(args.out, "casefiles"), args.files, args.php_days, args.cards,
+                   args.note_pages, args.seed)
+    make_assessment_exports(os.path.join(args.out, "assessments"), args.patients or args.files, seed=args.seed)
+    print(f"Synthetic inputs written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
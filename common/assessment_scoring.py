@@ -0,0 +1,89 @@
+"""
+Scores the standardized assessments from their item columns, shared by the
+statistical dataset builder and the dashboard.
+
+Each instrument in INSTRUMENTS lists its items, the range of one item's
+response and the items the legacy DERS export stores as "'-N" text. A
+merged assessment table has one column per question, named by the
+question's text starting with its item number ("5. * Being so restless..."),
+so items are found by that number rather than by column position. Questions
+whose wording changed between form versions share an item number, and their
+columns are read as one item.
+"""
+import re
+import numpy as np
+import pandas as pd
+
+INSTRUMENTS = {
+    "WHO": {"items": 5, "item_range": (0, 5)},
+    "GAD": {"items": 7, "item_range": (0, 3)},
+    "PHQ": {"items": 9, "item_range": (0, 3)},
+    "PCL": {"items": 20, "item_range": (0, 4)},
+    "DERS": {"items": 36, "item_range": (1, 5)},
+    "DERS2": {"items": 36, "item_range": (1, 5), "reversed": [1, 2, 6, 7, 8, 10, 17, 20, 22, 24, 34]},
+}
+
+# "'-3" as the legacy DERS export writes the response 3 to a reversed item
+reversed_response = re.compile(r"^'-(\d+)$")
+
+
+def max_total(instrument):
+    """The highest score the instrument can give."""
+    spec = INSTRUMENTS[instrument]
+    return float(spec["items"] * spec["item_range"][1])
+
+
+def item_number(column):
+    """The item number a question column starts with, or None."""
+    match = re.match(r"\s*(\d+)\.", str(column))
+    return int(match.group(1)) if match else None
+
+
+def item_columns(df, instrument):
+    """
+    The columns of each of the instrument's items, in table order, as
+    {item number: [columns]}. Raises ValueError if an item has no column or
+    a question column is numbered beyond the instrument's items.
+    """
+    n_items = INSTRUMENTS[instrument]["items"]
+    columns = {}
+    for col in df.columns:
+        number = item_number(col)
+        if number is not None:
+            columns.setdefault(number, []).append(col)
+    missing = [number for number in range(1, n_items + 1) if number not in columns]
+    extra = sorted(number for number in columns if not 1 <= number <= n_items)
+    if missing or extra:
+        problems = ([f"no column for items {missing}"] if missing else []) + \
+                   ([f"unknown items {extra}"] if extra else [])
+        raise ValueError(f"{instrument} table does not match its {n_items} items: {'; '.join(problems)}")
+    return {number: columns[number] for number in range(1, n_items + 1)}
+
+
+def item_matrix(df, instrument):
+    """
+    The responses as a rows x items float array. An item with several
+    columns takes each row's first response among them, and "'-N" responses
+    to reversed items are read as N. Raises ValueError for responses that
+    are not numbers.
+    """
+    reversed_items = set(INSTRUMENTS[instrument].get("reversed", []))
+    matrix = np.full((len(df), INSTRUMENTS[instrument]["items"]), np.nan)
+    for number, columns in item_columns(df, instrument).items():
+        responses = df[columns[0]]
+        for col in columns[1:]:
+            responses = responses.combine_first(df[col])
+        if number in reversed_items:
+            responses = responses.replace(reversed_response, r"\1", regex=True)
+        numeric = pd.to_numeric(responses, errors="coerce")
+        if numeric.notna().sum() != responses.notna().sum():
+            bad = responses[numeric.isna() & responses.notna()].unique()[:3]
+            raise ValueError(f"{instrument} item {number} has responses that are not numbers: {list(bad)}")
+        matrix[:, number - 1] = numeric.to_numpy(dtype=float)
+    return matrix
+
+
+def score(df, instrument):
+    """Each row's total score; unanswered items count as 0."""
+    return np.nansum(item_matrix(df, instrument), axis=1)
+
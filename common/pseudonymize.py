@@ -0,0 +1,67 @@
+"""
+Keyed pseudonyms for patient IDs, shared by the PDF parsers, the assessment
+merger and the statistical dataset builder so a patient gets the same
+group_identifier in every output.
+
+A pseudonym is the first 12 hex digits of HMAC-SHA256(key, patient ID). The
+key is read from the EXIST_PSEUDONYM_KEY environment variable, or from the
+file named by EXIST_PSEUDONYM_KEY_FILE (default ~/.exist/pseudonym.key).
+Every process reads the same key, so parser workers, separate tools and
+later runs all agree without sharing any state.
+"""
+import hashlib
+import hmac
+import logging
+import os
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+KEY_ENV_VAR = "EXIST_PSEUDONYM_KEY"
+KEY_FILE_ENV_VAR = "EXIST_PSEUDONYM_KEY_FILE"
+DEFAULT_KEY_FILE = os.path.join(os.path.expanduser("~"), ".exist", "pseudonym.key")
+
+# Used when no key is configured, so the tools still run; outputs made with
+# it are not protected by a secret
+FALLBACK_KEY = "XXXXXXXXXXXXXXXXX"
+
+PSEUDONYM_LENGTH = 12
+
+
+@lru_cache(maxsize=1)
+def load_key():
+    key = os.environ.get(KEY_ENV_VAR, "").strip()
+    if key:
+        return key.encode()
+    key_file = os.environ.get(KEY_FILE_ENV_VAR, DEFAULT_KEY_FILE)
+    if os.path.exists(key_file):
+        with open(key_file, "rb") as f:
+            key = f.read().strip()
+        if key:
+            return key
+    logging.warning(f"No pseudonymization key set in {KEY_ENV_VAR} or {key_file}; using the built-in key")
+    return FALLBACK_KEY.encode()
+
+
+def normalize_patient_id(patient_id):
+    """The text of a patient ID; 1234.0 read from a CSV column with blanks becomes "1234"."""
+    if isinstance(patient_id, float) and patient_id.is_integer():
+        patient_id = int(patient_id)
+    return str(patient_id).strip()
+
+
+@lru_cache(maxsize=100_000)
+def pseudonymize(patient_id):
+    message = normalize_patient_id(patient_id).encode()
+    return hmac.new(load_key(), message, hashlib.sha256).hexdigest()[:PSEUDONYM_LENGTH]
+
+
+def pseudonymize_series(patient_ids):
+    """
+    Pseudonymizes a whole column. Each distinct ID is hashed once and the
+    pseudonyms are spread back over the rows; missing IDs become None.
+    """
+    codes, uniques = pd.factorize(patient_ids)
+    # The trailing None is picked up by the -1 code of missing values
+    pseudonyms = np.array([pseudonymize(patient_id) for patient_id in uniques] + [None], dtype=object)
+    return pd.Series(pseudonyms[codes], index=patient_ids.index, dtype=object)
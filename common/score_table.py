@@ -0,0 +1,67 @@
+"""
+Lines up the scores of several assessments on (group_identifier,
+assessment_date), shared by the statistical dataset builder and the
+dashboard.
+
+Both used to chain one outer merge per assessment, reallocating the growing
+table each time and renaming the suffixed columns by position. Here every
+assessment's scores are indexed by the key and aligned in one concat.
+"""
+import numpy as np
+import pandas as pd
+
+KEY = ["group_identifier", "assessment_date"]
+
+
+def score_table(frames, value="score", key=KEY):
+    """
+    One row per key found in any of frames (assessment name -> frame), sorted
+    by key as an outer merge sorts them, and one column per assessment with
+    its value at that key. Each frame must hold every key at most once.
+    """
+    columns = [frame.set_index(key)[value].rename(name) for name, frame in frames.items()]
+    return pd.concat(columns, axis=1).sort_index(na_position="first").reset_index()
+
+
+def patient_means(frames, value="score", key=KEY):
+    """
+    The mean value of every assessment per group_identifier, as grouping the
+    chained outer merge of frames by group_identifier gives it.
+
+    Keys may repeat within a frame (two assessments on one day). The merge
+    then repeats each of those rows once for every row the other assessments
+    have at that key, so each row is weighted by the number of merged rows at
+    its key over the rows its own assessment has there.
+    """
+    names = list(frames)
+    long = pd.concat([frame[key + [value]] for frame in frames.values()], ignore_index=True)
+    assessment = np.repeat(np.arange(len(names)), [len(frame) for frame in frames.values()])
+    values = long[value].to_numpy(dtype=float)
+    answered = ~np.isnan(values)
+
+    # Rows, answered rows and their sum per (key, assessment), as key x assessment arrays
+    key_codes = long.groupby(key, dropna=False, sort=False).ngroup().to_numpy()
+    n_keys = key_codes.max() + 1 if len(key_codes) else 0
+    cells = key_codes * len(names) + assessment
+
+    def per_cell(weights=None):
+        return np.bincount(cells, weights, minlength=n_keys * len(names)).reshape(n_keys, len(names))
+
+    rows, counts, sums = per_cell(), per_cell(answered), per_cell(np.where(answered, values, 0.0))
+    merged_rows = np.maximum(rows, 1).prod(axis=1)
+    weights = merged_rows[:, None] / np.maximum(rows, 1)
+
+    # Sum the weighted cells per patient; keys without a group_identifier are dropped, as groupby drops them
+    patient_codes, patients = pd.factorize(long[key[0]], sort=True)
+    key_patients = np.empty(n_keys, dtype=int)
+    key_patients[key_codes] = patient_codes
+    keep = key_patients >= 0
+    weighted_sums, weighted_counts = (
+        np.stack([np.bincount(key_patients[keep], (cell * weights)[keep, i], minlength=len(patients))
+                  for i in range(len(names))], axis=1) if len(names) else np.empty((len(patients), 0))
+        for cell in (sums, counts))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(weighted_counts > 0, weighted_sums / weighted_counts, np.nan)
+    result = pd.DataFrame(means, columns=names)
+    result.insert(0, key[0], patients)
+    return result
@@ -1,12 +1,10 @@
 from dash import Dash, html, State, dash_table, dcc, Input, Output
 import dash_bootstrap_components as dbc
-import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime
 from spiderChart import spider
 from lineChart import time_series
-from wordCloud import generate_wordcloud
 from boxPlot import box_plot
 from bps_charts import generate_bps_figure, generate_sunburst_chart
 from php_daily import sparkline_figure, wordcloud_figure, craving_line_chart
@@ -14,44 +12,30 @@ from assessmentThresholds import assessment_thresholds
 from ahcm_charts import generate_ahcm_barplot, generate_patient_summary_table
 import json
 import os
+import sys
+# score_table.py and assessment_scoring.py are shared with the data wrangling
+# apps; copies next to app.py (as on PythonAnywhere) are found first
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from assessment_scoring import max_total
+from dashboard_data import assessments, bps_column_mapping, load_data
 
 # Load configuration from config.json
 with open('config.json', 'r') as config_file:
     config = json.load(config_file)
 data_directory = config['data_directory']
 
-
-# Function to format date columns
-def clean_dates(col):
-    return pd.to_datetime(col.str.split('M').str[0], format='mixed').dt.round('h')
-
-
-def clean_df(df):
-    # Format the date values, rounding to the hour
-    df['assessment_date'] = clean_dates(df['assessment_date'])
-    # Calculate assessment scores
-    df['score'] = df.iloc[:, 3:].sum(axis=1)
-    # Sort rows based on assessment date at the hour
-    df = df.sort_values(['group_identifier', 'assessment_date'])
-    # Round assessment date to the day
-    df['assessment_date'] = df['assessment_date'].dt.round('d')
-    # Drop extra rows from days patients did multiple assessments
-    df = df.drop_duplicates(subset=['group_identifier', 'assessment_date'], keep='last')
-    return df
-
-
-# Reading data
-who = pd.read_csv(os.path.join(data_directory, 'who_merged.csv'))
-gad = pd.read_csv(os.path.join(data_directory, "gad_merged.csv"))
-phq = pd.read_csv(os.path.join(data_directory, "phq_merged.csv"))
-pcl = pd.read_csv(os.path.join(data_directory, "ptsd_merged.csv"))
-ders = pd.read_csv(os.path.join(data_directory, "ders_merged.csv"))
-ders2 = pd.read_csv(os.path.join(data_directory, "ders2_merged.csv"))
-bps = pd.read_csv(os.path.join(data_directory, "bps_anonimized.csv"))
-php_daily = pd.read_csv(os.path.join(data_directory, "extracted_php_assessments.csv"))
-sub_history = pd.read_csv(os.path.join(data_directory, 'patient_substance_history.csv'))
-stat_tests_data = pd.read_csv(os.path.join(data_directory, 'stat_tests_data.csv'))
-ahcm_df = pd.read_csv(os.path.join(data_directory, "ahcm_survey_output.csv"))
+# Prepared tables, from the snapshot built by dashboard_data.py when it is up
+# to date with the data files, otherwise prepared from the data files
+data = load_data(data_directory, config.get('snapshot_path'))
+df = data['df']
+scores = data['scores']
+bps_df = data['bps_df']
+php_daily = data['php_daily']
+sub_history = data['sub_history']
+stat_tests_data = data['stat_tests_data']
+ahcm_df = data['ahcm_df']
+internal_wc = data['internal_wc']
+external_wc = data['external_wc']
 
 # Unique patient IDs
 ahcm_ids = ahcm_df['group_identifier'].unique()
@@ -84,44 +68,6 @@ ahcm_column_display_names = {
     "current_stress": "Current Stress Level"
 }
 
-# Cleaning data
-who = clean_df(who)
-phq = clean_df(phq)
-pcl = clean_df(pcl)
-
-# GAD
-gad['5. * Being so restless that it is too hard to sit still'] = gad[
-    '5. * Being so restless that it is too hard to sit still'].combine_first(
-    gad['5. * Being so restless that it’s hard to sit still'])
-gad.drop('5. * Being so restless that it’s hard to sit still', inplace=True, axis=1)
-gad = clean_df(gad)
-
-# DERS2
-reversed_questions = [1, 2, 6, 7, 8, 10, 17, 20, 22, 24, 34]
-reversed_elements = [str(x) for x in reversed_questions]
-reverse_cols = ders2.loc[:, ders2.columns.str.split('.').str[0].isin(reversed_elements)].columns
-mapping = {"'-1": 1, "'-2": 2, "'-3": 3, "'-4": 4, "'-5": 5}
-ders2[reverse_cols] = ders2[reverse_cols].apply(lambda x: x.map(mapping))
-
-# Combining DERS files
-ders2.columns = ders.columns
-ders = pd.concat([ders, ders2])
-ders = clean_df(ders)
-
-# BPS
-bps_column_mapping = {
-    'bps_medical': 'Medical', 'bps_employment': 'Employment', 'bps_peer_support': 'Peer Support',
-    'bps_drug_alcohol': 'Drug/Alcohol Usage', 'bps_legal': 'Legal', 'bps_family': 'Family/Social',
-    'bps_mh': 'Mental Health', 'bps_total': 'Total', 'bps_problems': 'Problems'
-}
-bps_df = bps.rename(columns=bps_column_mapping)
-
-# welcome page plots
-all_internal_motivation = " ".join(bps_df['int_motivation'].dropna())
-all_external_motivation = " ".join(bps_df['ext_motivation'].dropna())
-internal_wc = generate_wordcloud(all_internal_motivation, "Internal Motivation", "Blues")
-external_wc = generate_wordcloud(all_external_motivation, "External Motivation", "Oranges")
-
 # program type pie chart
 program_pie = px.pie(stat_tests_data, names='program',
                      title='Program Types', hole=0.3)
@@ -131,61 +77,11 @@ discharge_pie = px.pie(stat_tests_data, names='discharge_type',
                        title='Discharge Types', hole=0.3)
 discharge_pie.update_layout(title_text='Discharge Types', title_x=0.5, template="plotly_dark")
 
-# df for rows where use_flag = 1
-used_substances = sub_history[sub_history['use_flag'] == 1]
-
-# total number of unique patients
-total_patients = sub_history['group_identifier'].nunique()
-
-# Group the data by substance and pattern of use, counting the number of occurrences
-used_substances_grouped = used_substances[used_substances['use_flag'] == 1] \
-    .groupby(['substance', 'pattern_of_use_consolidated']) \
-    .size() \
-    .reset_index(name='count')
-
-# substance-level percentages (inner circle)
-substance_totals = used_substances_grouped.groupby('substance')['count'].sum().reset_index()
-substance_totals['percentage'] = (substance_totals['count'] / total_patients) * 100
-
-# pattern-level percentages (outer circle)
-used_substances_grouped['percentage'] = (used_substances_grouped['count'] / total_patients) * 100
 # Generate the Sunburst figure
-sunburst_fig = generate_sunburst_chart(used_substances_grouped, total_patients)
-
-# Combine all industry standard assessment data into one dataframe
-cols = ["group_identifier", "assessment_date", "score"]
-assessments = ["WHO", "GAD", "PHQ", "PCL", "DERS"]
-
-df = who[cols].merge(
-    gad[cols],
-    how="outer",
-    on=["group_identifier", "assessment_date"],
-    suffixes=("_WHO", "_GAD"),
-)
-df = df.merge(
-    phq[cols],
-    how="outer",
-    on=["group_identifier", "assessment_date"],
-    suffixes=(None, "_PHQ"),
-)
-df = df.merge(
-    pcl[cols],
-    how="outer",
-    on=["group_identifier", "assessment_date"],
-    suffixes=(None, "_PCL"),
-)
-df = df.merge(
-    ders[cols],
-    how="outer",
-    on=["group_identifier", "assessment_date"],
-    suffixes=(None, "_DERS"),
-)
-df.columns = ["group_identifier", "assessment_date"] + assessments
-
-scores = df.groupby("group_identifier")[assessments].mean()
+sunburst_fig = generate_sunburst_chart(data['used_substances_grouped'], data['total_patients'])
 
 # Total possible score for each assessment
-totals = [25.0, 21.0, 27.0, 80.0, 180.0]
+totals = [max_total(assessment) for assessment in assessments]
 
 # Current date
 now = datetime.now()
@@ -0,0 +1,245 @@
+"""
+Reads the dashboard's data files and prepares the tables app.py shows, and
+keeps them in a snapshot file so the app does not redo this on every start.
+
+Preparing the data (scoring and cleaning the assessments, lining up their
+scores, the substance use counts and the two motivation word clouds) takes
+longer than anything else when the app starts, and every restart or new
+server worker used to pay for it. build_snapshot saves the prepared tables
+to one file next to the data, along with the size and modification time of
+every data file they came from. load_data reads that snapshot when it still
+matches the data files and prepares the tables from the data files when it
+does not, saving a fresh snapshot for the next start.
+
+Build the snapshot after uploading new data files:
+
+    python dashboard_data.py
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+import pandas as pd
+from wordCloud import generate_wordcloud
+# score_table.py and assessment_scoring.py are shared with the data wrangling
+# apps; copies next to app.py (as on PythonAnywhere) are found first
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from score_table import score_table
+from assessment_scoring import score
+
+# Bump when the prepared tables change, so older snapshots count as stale
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FILE = "dashboard_snapshot.pkl"
+
+SOURCE_FILES = ["who_merged.csv", "gad_merged.csv", "phq_merged.csv", "ptsd_merged.csv", "ders_merged.csv",
+                "ders2_merged.csv", "bps_anonimized.csv", "extracted_php_assessments.csv",
+                "patient_substance_history.csv", "stat_tests_data.csv", "ahcm_survey_output.csv"]
+
+assessments = ["WHO", "GAD", "PHQ", "PCL", "DERS"]
+
+bps_column_mapping = {
+    'bps_medical': 'Medical', 'bps_employment': 'Employment', 'bps_peer_support': 'Peer Support',
+    'bps_drug_alcohol': 'Drug/Alcohol Usage', 'bps_legal': 'Legal', 'bps_family': 'Family/Social',
+    'bps_mh': 'Mental Health', 'bps_total': 'Total', 'bps_problems': 'Problems'
+}
+
+
+# Function to format date columns
+def clean_dates(col):
+    return pd.to_datetime(col.str.split('M').str[0], format='mixed').dt.round('h')
+
+
+def clean_df(df, instrument=None):
+    # Format the date values, rounding to the hour
+    df['assessment_date'] = clean_dates(df['assessment_date'])
+    # Calculate assessment scores from the instrument's item columns
+    if instrument:
+        df['score'] = score(df, instrument)
+    # Sort rows based on assessment date at the hour
+    df = df.sort_values(['group_identifier', 'assessment_date'])
+    # Round assessment date to the day
+    df['assessment_date'] = df['assessment_date'].dt.round('d')
+    # Drop extra rows from days patients did multiple assessments
+    df = df.drop_duplicates(subset=['group_identifier', 'assessment_date'], keep='last')
+    return df
+
+
+def source_path(data_directory, file_name):
+    """The file read for a data file: the typed Parquet version when the apps wrote one, else the CSV."""
+    base_path = os.path.join(data_directory, os.path.splitext(file_name)[0])
+    if os.path.exists(base_path + ".parquet"):
+        return base_path + ".parquet"
+    return base_path + ".csv"
+
+
+# Function to read a data file, preferring the typed Parquet version when the
+# parser apps wrote one next to (or instead of) the CSV
+def read_table(data_directory, file_name):
+    path = source_path(data_directory, file_name)
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+        # Filter and group on plain identifiers, as with the CSV inputs
+        category_cols = df.select_dtypes("category").columns
+        df[category_cols] = df[category_cols].astype(object)
+        return df
+    return pd.read_csv(path)
+
+
+def source_stamps(data_directory):
+    """The name, size and modification time of the file read for every data file; None for missing files."""
+    stamps = {}
+    for file_name in SOURCE_FILES:
+        path = source_path(data_directory, file_name)
+        try:
+            stat = os.stat(path)
+            stamps[file_name] = (os.path.basename(path), stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            stamps[file_name] = None
+    return stamps
+
+
+def prepare_data(data_directory):
+    """Reads the data files and prepares every table app.py uses, as {name: table}."""
+    who, gad, phq, pcl, ders, ders2, bps, php_daily, sub_history, stat_tests_data, ahcm_df = \
+        [read_table(data_directory, file_name) for file_name in SOURCE_FILES]
+
+    # Cleaning data; the two wordings of GAD item 5 are scored as one item
+    who = clean_df(who, "WHO")
+    gad = clean_df(gad, "GAD")
+    phq = clean_df(phq, "PHQ")
+    pcl = clean_df(pcl, "PCL")
+
+    # DERS and the legacy DERS are scored separately, then combined
+    ders = pd.concat([ders.assign(score=score(ders, "DERS")), ders2.assign(score=score(ders2, "DERS2"))])
+    ders = clean_df(ders)
+
+    # BPS
+    bps_df = bps.rename(columns=bps_column_mapping)
+
+    # welcome page word clouds
+    all_internal_motivation = " ".join(bps_df['int_motivation'].dropna())
+    all_external_motivation = " ".join(bps_df['ext_motivation'].dropna())
+    internal_wc = generate_wordcloud(all_internal_motivation, "Internal Motivation", "Blues")
+    external_wc = generate_wordcloud(all_external_motivation, "External Motivation", "Oranges")
+
+    # df for rows where use_flag = 1
+    used_substances = sub_history[sub_history['use_flag'] == 1]
+
+    # total number of unique patients
+    total_patients = sub_history['group_identifier'].nunique()
+
+    # Group the data by substance and pattern of use, counting the number of occurrences
+    used_substances_grouped = used_substances[used_substances['use_flag'] == 1] \
+        .groupby(['substance', 'pattern_of_use_consolidated']) \
+        .size() \
+        .reset_index(name='count')
+
+    # substance-level percentages (inner circle)
+    substance_totals = used_substances_grouped.groupby('substance')['count'].sum().reset_index()
+    substance_totals['percentage'] = (substance_totals['count'] / total_patients) * 100
+
+    # pattern-level percentages (outer circle)
+    used_substances_grouped['percentage'] = (used_substances_grouped['count'] / total_patients) * 100
+
+    # Combine all industry standard assessment data into one dataframe
+    df = score_table(dict(zip(assessments, [who, gad, phq, pcl, ders])))
+    scores = df.groupby("group_identifier")[assessments].mean()
+
+    return {"df": df, "scores": scores, "bps_df": bps_df, "php_daily": php_daily, "sub_history": sub_history,
+            "stat_tests_data": stat_tests_data, "ahcm_df": ahcm_df, "internal_wc": internal_wc,
+            "external_wc": external_wc, "used_substances_grouped": used_substances_grouped,
+            "substance_totals": substance_totals, "total_patients": total_patients}
+
+
+def snapshot_header(data_directory):
+    return {"version": SNAPSHOT_VERSION, "pandas": pd.__version__, "sources": source_stamps(data_directory)}
+
+
+def save_snapshot(data, data_directory, snapshot_path):
+    """
+    Writes the prepared tables to snapshot_path, after a header recording the
+    data files they came from. The file is written under a temporary name
+    and then renamed, so a server starting meanwhile never reads half of it.
+    """
+    temp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        pickle.dump(snapshot_header(data_directory), f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, snapshot_path)
+    return snapshot_path
+
+
+def load_snapshot(data_directory, snapshot_path):
+    """
+    The prepared tables from snapshot_path, or None when there is no snapshot
+    or it is stale: a data file was added, removed or changed since it was
+    built, or it was built by another snapshot version or pandas version.
+    """
+    try:
+        with open(snapshot_path, "rb") as f:
+            if pickle.load(f) != snapshot_header(data_directory):
+                return None
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Could not read the dashboard snapshot {snapshot_path}: {e}")
+        return None
+
+
+def default_snapshot_path(data_directory):
+    return os.path.join(data_directory, SNAPSHOT_FILE)
+
+
+def load_data(data_directory, snapshot_path=None):
+    """
+    The prepared tables, from the snapshot when it matches the data files.
+    Otherwise they are prepared from the data files and a fresh snapshot is
+    saved, if the folder can be written to.
+    """
+    snapshot_path = snapshot_path or default_snapshot_path(data_directory)
+    data = load_snapshot(data_directory, snapshot_path)
+    if data is not None:
+        return data
+
+    print(f"⚠️ Dashboard snapshot missing or out of date; preparing the data from {data_directory}")
+    data = prepare_data(data_directory)
+    try:
+        save_snapshot(data, data_directory, snapshot_path)
+    except OSError as e:
+        print(f"⚠️ Could not save the dashboard snapshot {snapshot_path}: {e}")
+    return data
+
+
+def build_snapshot(data_directory, snapshot_path=None):
+    """Prepares the tables from the data files and saves them as the snapshot; returns its path."""
+    snapshot_path = snapshot_path or default_snapshot_path(data_directory)
+    return save_snapshot(prepare_data(data_directory), data_directory, snapshot_path)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Build the dashboard's data snapshot from its data files.")
+    arg_parser.add_argument("--config", default="config.json", help="dashboard config file")
+    arg_parser.add_argument("--data-directory", help="data folder (default: data_directory in the config)")
+    arg_parser.add_argument("--snapshot", help="snapshot file (default: snapshot_path in the config, "
+                                                f"else {SNAPSHOT_FILE} in the data folder)")
+    args = arg_parser.parse_args(argv)
+
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config, "r") as config_file:
+            config = json.load(config_file)
+    data_directory = args.data_directory or config.get("data_directory")
+    if not data_directory:
+        arg_parser.error("no --data-directory given and no data_directory in the config")
+
+    start = time.perf_counter()
+    snapshot_path = build_snapshot(data_directory, args.snapshot or config.get("snapshot_path"))
+    print(f"✅ Dashboard snapshot saved at {snapshot_path} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
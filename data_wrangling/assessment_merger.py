@@ -1,53 +1,369 @@
 import pandas as pd
 import os
 from glob import glob
-import hashlib
-import tkinter as tk
-from tkinter import filedialog, messagebox
+import sys
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+try:
+    import tkinter as tk
+    from tkinter import filedialog, messagebox
+except ImportError:
+    # Headless installs use the merger from other code only
+    tk = filedialog = messagebox = None
+from output_formats import OUTPUT_FORMATS, output_path as format_output_path, write_table
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from pseudonymize import pseudonymize_series
 
 # Global variables to store folder paths
 input_path = ""
 output_path = ""
 
-# Secret key for pseudonymization
-SECRET_KEY = "XXXXXXXXXXXXXXXXX"
-name_mapping = dict()
+# Columns of an assessment export that describe the question; every other
+# column holds the responses given on one assessment date
+fixed_columns = ['question', 'code', 'issue', 'issue_code']
 
-def pseudonymize_function(patient_id):
-    if patient_id not in name_mapping:
-        hash_input = (SECRET_KEY + patient_id).encode()
-        hashed_value = hashlib.sha256(hash_input).hexdigest()[:12]
-        name_mapping[patient_id] = f"{hashed_value}"
-    return name_mapping[patient_id]
+# Only the question text and the responses are merged, so the C engine skips
+# the other question columns and reads question as text without inferring
+# its type; only the responses are inferred
+unused_columns = {'code', 'issue', 'issue_code'}
+export_dtypes = {'question': str}
 
-def process_assessment_csvs(input_folder, output_folder, assessment_name):
-    csv_files = glob(os.path.join(input_folder, '*.csv'))
-    df_list = []
+# CSV engines read_csv can load the exports with; pyarrow needs the pyarrow package
+CSV_ENGINES = ("c", "pyarrow")
+
+# Memory the merge needs per byte of export CSV, measured on the synthetic
+# exports; sizes the chunks of the streamed merge
+MEMORY_PER_CSV_BYTE = 10
+
+ASSESSMENT_TYPES = ["WHO", "GAD", "PHQ", "PTSD", "DERS", "DERS2"]
+
+# Other names an export file or folder may use for an assessment type
+assessment_aliases = {"PCL": "PTSD", "PCL5": "PTSD", "PCL-5": "PTSD"}
+
+# Questions on each assessment, for exports whose name and folder do not
+# say which assessment they hold
+assessment_question_counts = {"WHO": 5, "GAD": 7, "PHQ": 9, "PTSD": 20, "DERS": 36}
+
+def response_sample(responses, empty, response_samples=None):
+    """
+    One response of the file (an empty one if it has no responses), typed
+    as melting the file's responses into one column would type them. empty
+    flags the date columns without any response.
+
+    Files with the same (column type, all empty) signature of their date
+    columns melt to the same type, so one merge can pass a dict to keep one
+    sample per signature in and skip melting the files that repeat one.
+    """
+    signature = tuple(zip(map(str, responses.dtypes), empty))
+    if response_samples is None or signature not in response_samples:
+        melted = responses.melt()['value']
+        present = melted.dropna()
+        sample = present.iloc[:1] if len(present) else melted.iloc[:1]
+        if response_samples is None:
+            return sample
+        response_samples[signature] = sample
+    return response_samples[signature]
+
+def dedup_columns(columns):
+    """Renames repeated column names to name.1, name.2, ... as the C engine does."""
+    seen = {}
+    names = []
+    for col in columns:
+        count = seen.get(col, 0)
+        seen[col] = count + 1
+        names.append(f"{col}.{count}" if count else col)
+    return names
+
+def read_export_wide(file_path, engine="c", response_samples=None):
+    """
+    Reads one assessment export as one row per assessment date and one column
+    per question. The export is already question-by-date, so it only needs
+    transposing. A question listed twice keeps its first non-empty response,
+    and dates without any response are dropped. Also returns the file's
+    response_sample, which combine_exports uses to type all responses;
+    response_samples is the merge's dict of samples by signature, if any.
+    """
+    if engine == "pyarrow":
+        # The pyarrow engine cannot combine a dtype map with missing integer
+        # responses or take a usecols function, and keeps repeated date
+        # headers (two assessments on one day) as they are
+        df = pd.read_csv(file_path, engine=engine)
+        df.columns = dedup_columns(df.columns)
+    else:
+        df = pd.read_csv(file_path, engine=engine, dtype=export_dtypes,
+                         usecols=lambda col: col not in unused_columns)
+    date_positions = [i for i, col in enumerate(df.columns) if col not in fixed_columns + ['file_name']]
+    responses = df.iloc[:, date_positions]
+    values = responses.to_numpy()
+    answered = pd.notna(values).any(axis=0)
+    sample = response_sample(responses, tuple(~answered), response_samples)
+    questions = df['question']
+    if questions.isna().any() or questions.duplicated().any():
+        by_question = responses.set_index(questions)
+        by_question = by_question[by_question.index.notna()].groupby(level=0, sort=False).first()
+        questions, values = by_question.index, by_question.to_numpy()
+        answered = pd.notna(values).any(axis=0)
+    wide = pd.DataFrame(values.T[answered], index=responses.columns[answered], columns=questions)
+    return wide, sample
+
+def map_files(read_one, file_paths, workers=None):
+    """
+    read_one(file_path) for every file, in file order. With workers > 1 the
+    files are fanned out across a ProcessPoolExecutor.
+    """
+    if not workers or workers <= 1 or len(file_paths) <= 1:
+        return list(map(read_one, file_paths))
+    chunksize = max(1, len(file_paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(read_one, file_paths, chunksize=chunksize))
+
+def read_exports(file_paths, workers=None, engine="c", response_samples=None):
+    """
+    read_export_wide for every file, in file order, sharing response_samples
+    (a new dict if not given) across the files read in this process.
+    """
+    if response_samples is None:
+        response_samples = {}
+    return map_files(partial(read_export_wide, engine=engine, response_samples=response_samples), file_paths, workers)
+
+def assessment_type_of(name):
+    """The assessment type a file name prefix or folder name stands for, or None."""
+    name = name.upper()
+    if name in ASSESSMENT_TYPES:
+        return name
+    return assessment_aliases.get(name)
+
+def assessment_types_from_name(file_path, input_folder):
+    """
+    The assessment types named by the nearest folder between input_folder and
+    the file, and by the file name prefix ([assessment_name]_[MR#]_[YYYYMMDD].csv),
+    as (folder type, prefix type); either is None if it names no type.
+    """
+    folders = os.path.relpath(os.path.dirname(file_path), input_folder).split(os.sep)
+    folder_types = [assessment_type_of(folder) for folder in folders[::-1] if assessment_type_of(folder)]
+    return (folder_types[0] if folder_types else None,
+            assessment_type_of(os.path.basename(file_path).split('_')[0]))
+
+def assessment_type_from_content(wide):
+    """
+    The assessment type of an export by its number of questions. DERS and
+    the DERS legacy both have 36; the legacy form stores its reversed items
+    as "'-1" style text. None if the count matches no assessment.
+    """
+    question_count = wide.shape[1]
+    if question_count == assessment_question_counts["DERS"]:
+        responses = wide.stack()
+        legacy = responses.astype(str).str.startswith("'-").any() if len(responses) else False
+        return "DERS2" if legacy else "DERS"
+    for assessment, count in assessment_question_counts.items():
+        if count == question_count:
+            return assessment
+    return None
+
+def read_any_export(file_path, input_folder, engine="c", response_samples=None):
+    """
+    read_export_wide for a file of an export tree, with the file's assessment
+    type taken from its folder, which the export instructions require, or
+    else its name prefix. When the folder and prefix disagree, such as a
+    legacy export named ders_... in the ders2 folder, the contents decide
+    between them, and the folder wins if they match neither. Files of no
+    named type are typed by their contents. Returns (None, None) for CSVs
+    without a question column, which are not assessment exports, and raises
+    ValueError naming any CSV that cannot be read.
+    """
+    try:
+        export = read_export_wide(file_path, engine, response_samples)
+    except KeyError as e:
+        if e.args != ('question',):
+            raise
+        # No question column, such as the clinical data report
+        print(f"⚠️ {file_path} has no question column and is not an assessment export, skipped")
+        return None, None
+    except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        raise ValueError(f"Could not read {file_path}: {e}") from e
+    folder_type, prefix_type = assessment_types_from_name(file_path, input_folder)
+    if folder_type and prefix_type and folder_type != prefix_type:
+        content_type = assessment_type_from_content(export[0])
+        return (content_type if content_type in (folder_type, prefix_type) else folder_type), export
+    return folder_type or prefix_type or assessment_type_from_content(export[0]), export
 
-    for file_path in csv_files:
-        df = pd.read_csv(file_path)
-        df['file_name'] = os.path.basename(file_path)
+def response_type(samples):
+    """
+    The one type that holds every file's responses. Concatenating one sample
+    per file resolves it exactly as concatenating every response would,
+    including ignoring all-empty files.
+    """
+    return pd.concat(samples).dtype
 
-        fixed_columns = ['question', 'code', 'issue', 'issue_code', 'file_name']
-        date_columns = [col for col in df.columns if col not in fixed_columns]
+def stack_exports(file_paths, exports, response_dtype):
+    """The per-file wide frames as one frame indexed by (file_name, assessment_date), sorted."""
+    frames = {os.path.basename(file_path): wide.astype(response_dtype)
+              for file_path, (wide, _) in zip(file_paths, exports)}
+    # Files without responses add nothing, and would turn integer columns float
+    with_responses = {file_name: wide for file_name, wide in frames.items() if len(wide)}
+    return pd.concat(with_responses or frames, names=['file_name', 'assessment_date']).sort_index()
 
-        df_melted = df.melt(id_vars=fixed_columns,
-                            value_vars=date_columns,
-                            var_name='assessment_date',
-                            value_name='response')
+def shared_type(dtypes):
+    """Like a pivot, all questions share one type, so a question without gaps becomes float when another has them."""
+    return pd.concat([pd.Series(dtype=dtype) for dtype in dtypes]).dtype
 
-        df_list.append(df_melted)
+def combine_exports(file_paths, exports):
+    """
+    Stacks the per-file wide frames into one row per (file_name,
+    assessment_date), sorted, with the questions as sorted columns. Responses
+    take the one type that holds every file's responses, and questions
+    without any response are dropped.
+    """
+    df_wide = stack_exports(file_paths, exports, response_type([sample for _, sample in exports]))
+    df_wide = df_wide.dropna(axis=1, how='all')
+    if len(df_wide.columns):
+        df_wide = df_wide.astype(shared_type(df_wide.dtypes))
+    df_wide = df_wide.sort_index(axis=1)
+    df_wide.columns.name = None
+    return df_wide.reset_index()
 
-    df_combined = pd.concat(df_list, ignore_index=True)
+def chunk_files(file_paths, memory_budget_mb):
+    """
+    Splits the files, sorted by name, into consecutive chunks whose exports
+    fit in memory_budget_mb once read. Every chunk holds at least one file.
+    """
+    budget = memory_budget_mb * 2 ** 20 / MEMORY_PER_CSV_BYTE
+    chunks, chunk, chunk_bytes = [], [], 0
+    for file_path in sorted(file_paths, key=os.path.basename):
+        size = os.path.getsize(file_path)
+        if chunk and chunk_bytes + size > budget:
+            chunks.append(chunk)
+            chunk, chunk_bytes = [], 0
+        chunk.append(file_path)
+        chunk_bytes += size
+    return chunks + [chunk] if chunk else chunks
 
-    df_final = df_combined.pivot_table(index=['file_name', 'assessment_date'],
-                                       columns='question',
-                                       values='response',
-                                       aggfunc='first').reset_index()
-    df_final.columns.name = None
+def column_samples(df_wide):
+    """
+    One row per column, holding the column's first response (or nothing if
+    it has none) in the column's type. Concatenating these samples gives the
+    column types concatenating the frames would.
+    """
+    return pd.DataFrame({col: df_wide[col].dropna().iloc[:1].reset_index(drop=True)
+                         if df_wide[col].notna().any() else df_wide[col].iloc[:1].reset_index(drop=True)
+                         for col in df_wide.columns})
 
+def stream_assessment_csvs(csv_files, output_folder, assessment_name, memory_budget_mb, workers=None, engine="c",
+                           spill_folder=None):
+    """
+    Merges the exports in chunks that fit memory_budget_mb and writes the same
+    CSV combine_exports and write_merged would, without holding every export
+    in memory at once.
+
+    The files are chunked in name order, so each chunk holds one run of the
+    sorted (file_name, assessment_date) keys. Each chunk is read and spilled
+    to spill_folder (a temporary folder by default), then stacked once the
+    type of all responses is known. The question columns and their shared
+    type depend on every chunk; they are resolved from one sample row per
+    column and chunk, and then the chunks are appended to the output in
+    order with those columns and that type.
+    """
+    out_file = format_output_path(output_folder, f"{assessment_name.lower()}_merged", "csv")
+    with tempfile.TemporaryDirectory(dir=spill_folder) as spill:
+        parts, samples, response_samples = [], [], {}
+        for i, chunk in enumerate(chunk_files(csv_files, memory_budget_mb)):
+            exports = read_exports(chunk, workers, engine, response_samples)
+            parts.append((os.path.join(spill, f"part{i}.pkl"), chunk, any(len(wide) for wide, _ in exports)))
+            pd.to_pickle(exports, parts[-1][0])
+            # One sample per chunk types the responses as one per file would
+            chunk_samples = pd.concat([sample for _, sample in exports])
+            present = chunk_samples.dropna()
+            samples.append(present.iloc[:1] if len(present) else chunk_samples.iloc[:1])
+        response_dtype = response_type(samples)
+
+        # Chunks without responses add nothing, unless no chunk has any
+        parts = [part for part in parts if part[2]] or parts
+        if not any(part[2] for part in parts):
+            exports = [export for part_file, _, _ in parts for export in pd.read_pickle(part_file)]
+            return write_merged(combine_exports([f for _, chunk, _ in parts for f in chunk], exports),
+                                output_folder, assessment_name)
+
+        column_types = []
+        for part_file, chunk, _ in parts:
+            df_wide = stack_exports(chunk, pd.read_pickle(part_file), response_dtype)
+            pd.to_pickle(df_wide, part_file)
+            column_types.append(column_samples(df_wide))
+        columns = pd.concat(column_types).dropna(axis=1, how='all').columns
+        final_dtype = shared_type(pd.concat(column_types)[columns].dtypes) if len(columns) else None
+
+        for i, (part_file, _, _) in enumerate(parts):
+            df_wide = pd.read_pickle(part_file).reindex(columns=sorted(columns))
+            if final_dtype is not None:
+                df_wide = df_wide.astype(final_dtype)
+            df_wide.columns.name = None
+            anonymize_merged(df_wide.reset_index()).to_csv(out_file, mode='w' if i == 0 else 'a',
+                                                            header=i == 0, index=False)
+    return out_file
+
+def process_assessment_csvs(input_folder, output_folder, assessment_name, output_format="csv", workers=None,
+                            engine="c", memory_budget_mb=None):
+    """
+    Merges the exports of one assessment type. With memory_budget_mb set, the
+    exports are merged in chunks that fit the budget by
+    stream_assessment_csvs; the streamed merge writes CSV only.
+    """
+    csv_files = glob(os.path.join(input_folder, '*.csv'))
+    if memory_budget_mb:
+        if output_format != "csv":
+            raise ValueError("The chunked merge writes CSV only")
+        return stream_assessment_csvs(csv_files, output_folder, assessment_name, memory_budget_mb, workers, engine)
+    exports = read_exports(csv_files, workers, engine)
+    return write_merged(combine_exports(csv_files, exports), output_folder, assessment_name, output_format)
+
+def merge_all_assessments(input_folder, workers=None, engine="c"):
+    """
+    Merges every assessment type in an export tree in one pass. The tree is
+    walked once and every CSV in it is read once; each export is filed under
+    the assessment type of its name or folder (or, failing that, its
+    contents) and each type is merged as process_assessment_csvs would.
+    Returns {assessment type: anonymized merged table} for the types found.
+    """
+    csv_files = sorted(glob(os.path.join(input_folder, '**', '*.csv'), recursive=True))
+    read_one = partial(read_any_export, input_folder=input_folder, engine=engine, response_samples={})
+    by_type = {}
+    for file_path, (assessment, export) in zip(csv_files, map_files(read_one, csv_files, workers)):
+        if export is None:
+            continue
+        if assessment is None:
+            print(f"⚠️ Could not tell the assessment type of {file_path}, skipped")
+            continue
+        by_type.setdefault(assessment, []).append((file_path, export))
+
+    merged = {}
+    for assessment in ASSESSMENT_TYPES:
+        if assessment not in by_type:
+            print(f"⚠️ No {assessment} exports found in {input_folder}")
+            continue
+        file_paths, exports = zip(*by_type[assessment])
+        merged[assessment] = anonymize_merged(combine_exports(list(file_paths), list(exports)))
+        print(f"✅ {assessment}: merged {len(file_paths)} exports")
+    return merged
+
+def write_merged_tables(merged, output_folder, output_format="csv"):
+    """Writes merge_all_assessments' tables as *_merged files; returns {assessment type: output file}."""
+    return {assessment: write_table(df_anon, format_output_path(output_folder, f"{assessment.lower()}_merged",
+                                                                output_format), output_format)
+            for assessment, df_anon in merged.items()}
+
+def process_all_assessment_csvs(input_folder, output_folder, output_format="csv", workers=None, engine="c"):
+    """
+    Builds every *_merged output from one export tree in one pass with
+    merge_all_assessments. Returns {assessment type: output file} for the
+    types found.
+    """
+    return write_merged_tables(merge_all_assessments(input_folder, workers, engine), output_folder, output_format)
+
+def anonymize_merged(df_final):
+    """Replaces the file names (and the patient IDs in them) with group identifiers."""
     df_final['patient_ID'] = df_final['file_name'].str.extract(r'_(LO-\d{4}-\d+)_')
-    df_final['group_identifier'] = df_final['patient_ID'].apply(lambda x: pseudonymize_function(x) if pd.notnull(x) else None)
+    df_final['group_identifier'] = pseudonymize_series(df_final['patient_ID'])
 
     column_order = ["file_name", "group_identifier", "assessment_date"] + \
                    [col for col in df_final.columns if col not in ["file_name", "group_identifier", "assessment_date"]]
@@ -56,11 +372,13 @@ def process_assessment_csvs(input_folder, output_folder, assessment_name):
     df_anon = df_final.drop(columns=['file_name', 'patient_ID'])
     cols = ['group_identifier', 'assessment_date'] + \
            [col for col in df_anon.columns if col not in ['group_identifier', 'assessment_date']]
-    df_anon = df_anon[cols]
+    return df_anon[cols]
 
-    out_file = os.path.join(output_folder, f"{assessment_name.lower()}_merged.csv")
-    df_anon.to_csv(out_file, index=False)
-    return out_file
+def write_merged(df_final, output_folder, assessment_name, output_format="csv"):
+    """Anonymizes and writes the merged table."""
+    df_anon = anonymize_merged(df_final)
+    out_file = format_output_path(output_folder, f"{assessment_name.lower()}_merged", output_format)
+    return write_table(df_anon, out_file, output_format)
 
 def select_input_folder():
     global input_path
@@ -90,10 +408,25 @@ def run_selected_parser():
 
     parser_type = parser_selection.get()
 
-    if parser_type in ["WHO", "GAD", "PHQ", "PTSD", "DERS", "DERS2"]:
+    if parser_type == "ALL":
+        try:
+            output_files = process_all_assessment_csvs(input_path, output_path, output_format.get(),
+                                                       workers=os.cpu_count())
+            if not output_files:
+                messagebox.showwarning("No Assessments Found", f"No assessment exports were found in:\n{input_path}")
+                return
+            missing = [assessment for assessment in ASSESSMENT_TYPES if assessment not in output_files]
+            message = "Assessments processed successfully!\nOutputs saved at:\n" + "\n".join(output_files.values())
+            if missing:
+                message += f"\n\nNo exports found for: {', '.join(missing)}"
+            messagebox.showinfo("Success", message)
+        except Exception as e:
+            messagebox.showerror("Error", f"An error occurred while processing the assessments:\n{str(e)}")
+    elif parser_type in ASSESSMENT_TYPES:
         try:
-            output_file = process_assessment_csvs(input_path, output_path, parser_type)
-            messagebox.showinfo("Success", f"{parser_type} assessment processed successfully!\nCSV saved at:\n{output_file}")
+            output_file = process_assessment_csvs(input_path, output_path, parser_type, output_format.get(),
+                                                  workers=os.cpu_count())
+            messagebox.showinfo("Success", f"{parser_type} assessment processed successfully!\nOutput saved at:\n{output_file}")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred while processing {parser_type} assessments:\n{str(e)}")
     else:
@@ -102,7 +435,7 @@ def run_selected_parser():
 def create_gui():
     root = tk.Tk()
     root.title("Standardized Assessment Merger")
-    root.geometry("500x400")
+    root.geometry("500x470")
 
     instructions = tk.Label(root, text="Select assessment type and choose input/output folders", justify="center")
     instructions.pack(pady=10)
@@ -110,7 +443,7 @@ def create_gui():
     global parser_selection
     parser_selection = tk.StringVar(value="WHO")
 
-    for assessment in ["WHO", "GAD", "PHQ", "PTSD", "DERS", "DERS2"]:
+    for assessment in ASSESSMENT_TYPES + ["ALL"]:
         rb = tk.Radiobutton(root, text=assessment, variable=parser_selection, value=assessment)
         rb.pack(anchor="w", padx=20)
 
@@ -128,10 +461,19 @@ def create_gui():
     output_label = tk.Label(root, text="Output: Not selected", fg="black", font=("Helvetica", 12))
     output_label.pack(pady=2)
 
+    global output_format
+    output_format = tk.StringVar(value="csv")
+    format_frame = tk.Frame(root)
+    format_frame.pack(pady=5)
+    tk.Label(format_frame, text="Output format:").pack(side="left")
+    for fmt in OUTPUT_FORMATS:
+        tk.Radiobutton(format_frame, text=fmt.upper(), variable=output_format, value=fmt).pack(side="left")
+
     run_button = tk.Button(root, text="Run Merger", command=run_selected_parser)
     run_button.pack(pady=20)
 
     root.mainloop()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     create_gui()
@@ -0,0 +1,57 @@
+import os
+import pandas as pd
+
+OUTPUT_FORMATS = ("csv", "parquet")
+
+def shrink_numeric(col):
+    """
+    Returns col as the smallest nullable integer type that holds it, or as
+    float32 for fractional values. Columns with any value that is not a number
+    (such as the "'-1" style DERS2 responses) are returned as strings.
+    """
+    numeric = pd.to_numeric(col, errors="coerce")
+    if numeric.notna().sum() != col.notna().sum():
+        return col.astype("string")
+    values = numeric.dropna()
+    if not (values % 1 == 0).all():
+        return numeric.astype("float32")
+    for dtype, limit in (("Int8", 2 ** 7), ("Int16", 2 ** 15), ("Int32", 2 ** 31)):
+        if values.empty or values.abs().max() < limit:
+            return numeric.astype(dtype)
+    return numeric.astype("Int64")
+
+
+def typed_assessment_frame(df):
+    """
+    Explicit column types for a merged assessment or a dataset built from
+    them: group_identifier is categorical, responses and scores are small
+    integers and other text is a string. assessment_date is kept as the text
+    of the export header, which the builder and dashboard parse themselves.
+    """
+    df = df.copy()
+    for col in df.columns:
+        if col == "group_identifier":
+            df[col] = df[col].astype("category")
+        elif col == "assessment_date":
+            df[col] = df[col].astype("string")
+        elif not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = shrink_numeric(df[col])
+    return df
+
+
+def output_path(output_folder, base_name, output_format):
+    return os.path.join(output_folder, f"{base_name}.{output_format}")
+
+
+def write_table(df, out_file, output_format):
+    if output_format == "parquet":
+        typed_assessment_frame(df).to_parquet(out_file, index=False)
+    else:
+        df.to_csv(out_file, index=False)
+    return out_file
+
+
+def read_table(file_path):
+    if file_path.lower().endswith(".parquet"):
+        return pd.read_parquet(file_path)
+    return pd.read_csv(file_path)
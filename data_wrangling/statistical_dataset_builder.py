@@ -1,135 +1,227 @@
 import pandas as pd
 import os
-import hashlib
-import tkinter as tk
-from tkinter import filedialog, messagebox
+import sys
+import argparse
 from glob import glob
+from output_formats import OUTPUT_FORMATS, output_path as format_output_path, read_table, write_table
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from pseudonymize import pseudonymize_series
+from score_table import patient_means
+from assessment_scoring import score
 import warnings
 warnings.filterwarnings('ignore')
+try:
+    import tkinter as tk
+    from tkinter import filedialog, messagebox
+except ImportError:
+    # Headless installs run the builder from the command line only
+    tk = filedialog = messagebox = None
 
 # Global variables to store folder paths
 input_path = ""
 output_path = ""
 clinical_path = ""
 
-# Secret key for pseudonymization
-SECRET_KEY = "XXXXXXXXXXXXXXXXX"
-name_mapping = dict()
-
-def pseudonymize_function(patient_id):
-    if patient_id not in name_mapping:
-        hash_input = (SECRET_KEY + str(patient_id)).encode()
-        hashed_value = hashlib.sha256(hash_input).hexdigest()[:12]
-        name_mapping[patient_id] = f"{hashed_value}"
-    return name_mapping[patient_id]
-
 def clean_dates(col):
     return pd.to_datetime(col.astype(str).str.split(' ').str[0], format='mixed', errors='coerce')
 
+# Merged assessment file names, by the key the builder files them under
+merged_file_keys = [('who_merged', 'WHO'), ('gad_merged', 'GAD'), ('phq_merged', 'PHQ'), ('ptsd_merged', 'PCL'),
+                    ('pcl', 'PCL'), ('ders2_merged', 'DERS2'), ('ders_merged', 'DERS')]
+required_assessments = ['WHO', 'GAD', 'PHQ', 'PCL', 'DERS', 'DERS2']
+
+def load_merged_assessments(folder_path):
+    """Reads the *_merged CSV or Parquet files in a folder, keyed by assessment."""
+    csv_files = glob(os.path.join(folder_path, '*.csv')) + glob(os.path.join(folder_path, '*.parquet'))
+
+    assessments_dict = dict()
+    for file_path in csv_files:
+        file_name = os.path.basename(file_path).lower()
+        for name, key in merged_file_keys:
+            if name in file_name:
+                assessments_dict[key] = read_table(file_path)
+                break
+    return assessments_dict
+
+def as_read_from_csv(df):
+    """
+    A merged table straight from the merger, with its responses typed as
+    reading back its CSV would type them: columns holding only numbers become
+    numeric, and the values of other columns become text.
+    """
+    df = df.copy()
+    for col in df.columns.drop(['group_identifier', 'assessment_date'], errors='ignore'):
+        try:
+            df[col] = pd.to_numeric(df[col])
+        except (ValueError, TypeError):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+program_groups = {
+    'Mental Health PHP': 'Mental Health',
+    'Mental Health IOP': 'Mental Health',
+    'Substance Use PHP': 'Substance Use',
+    'Substance Use IOP': 'Substance Use'
+}
+discharge_groups = {
+    'Treatment Complete - Successful Discharge': 'Successful Discharge',
+    'ATA - Unsuccessful Discharge':'Unsuccessful Discharge',
+    'Unauthorized Absences - Unsuccessful Discharge':'Unsuccessful Discharge',
+    'Transfer and Referrals - Involuntary Discharge':'Involuntary Discharge',
+    'Administrative Discharge - Involuntary Discharge':'Involuntary Discharge'
+}
+feature_names = ['first', 'last', 'slope', 'count', 'change']
+
+def score_assessments(assessments_dict):
+    """
+    Every assessment's scores as {assessment: group_identifier,
+    assessment_date, score}, from each table's item columns (see
+    common/assessment_scoring.py). The legacy DERS2 counts as DERS.
+    """
+    for r in required_assessments:
+        if r not in assessments_dict:
+            raise ValueError(f"Missing assessment file: {r}")
+
+    scored = {assessment: pd.DataFrame({'group_identifier': assessments_dict[assessment]['group_identifier'],
+                                        'assessment_date': clean_dates(assessments_dict[assessment]['assessment_date']),
+                                        'score': score(assessments_dict[assessment], assessment)})
+              for assessment in required_assessments}
+    scored['DERS'] = pd.concat([scored['DERS'], scored.pop('DERS2')], ignore_index=True)
+    return scored
+
+def clinical_programs(clinical):
+    """Each patient's admission and discharge dates, program and discharge type, from the clinical data report or its path."""
+    df_clinical = clinical if isinstance(clinical, pd.DataFrame) else pd.read_csv(clinical)
+
+    sub_clinical = df_clinical[['MR','Admission Date','Discharge Date','Program','Discharge Type']]
+    sub_clinical = sub_clinical.rename(columns={'MR':'patient_ID'})
+    sub_clinical['group_identifier'] = pseudonymize_series(sub_clinical['patient_ID'])
+    sub_clinical.drop(columns='patient_ID', inplace=True)
+
+    sub_clinical = sub_clinical.rename(columns={'Admission Date':'admission_dt', 'Discharge Date':'discharge_dt', 'Program':'program', 'Discharge Type':'discharge_type'})
+    sub_clinical['program'] = sub_clinical['program'].replace(program_groups)
+    sub_clinical['discharge_type'] = sub_clinical['discharge_type'].replace(discharge_groups)
+    return sub_clinical
+
+def program_means(scored, programs):
+    """Each patient's mean score on every assessment, joined to their program."""
+    # Same-day assessments repeat a key here, which patient_means weights
+    # as the chained outer merges it replaced did
+    return patient_means(scored).merge(programs, on='group_identifier')
+
+def build_longitudinal_features(scored, programs):
+    """
+    One row per patient with their stays and, for every assessment, the
+    first and last score, the least-squares slope of the score per day, the
+    number of dated scores and the change from the first to the last score
+    taken during the program.
+
+    A patient readmitted under the same MR has one clinical report row per
+    stay, and these are combined into one row: admission_dt is the first
+    admission; discharge_dt, program and discharge_type are those of the
+    latest stay, so discharge_dt and discharge_type stay empty while it is
+    ongoing; days_in_program adds up the days of the finished stays and
+    stays counts them all. "During the program" is the union of the stays,
+    with an ongoing stay open-ended, so scores taken between two stays do
+    not count towards the change.
+
+    Slopes need two assessment dates and changes two scores within the
+    program, otherwise they are empty. Every statistic comes from grouped
+    sums over all patients at once, so the cost grows with the number of
+    scores rather than the number of patients.
+    """
+    keys = ['group_identifier', 'assessment']
+    long = pd.concat([df.assign(assessment=assessment) for assessment, df in scored.items()], ignore_index=True)
+    long = long.dropna(subset=['group_identifier', 'assessment_date'])
+    long = long.sort_values(keys + ['assessment_date'], kind='stable')
+
+    # Days since the patient's first score on the assessment keeps the sums small
+    days = long['assessment_date'] - long.groupby(keys)['assessment_date'].transform('min')
+    long['x'] = days.dt.days.astype(float)
+    long['xy'] = long['x'] * long['score']
+    long['xx'] = long['x'] ** 2
+
+    grouped = long.groupby(keys)
+    features = grouped['score'].agg(['first', 'last', 'count'])
+    sums = grouped[['x', 'score', 'xy', 'xx']].sum()
+    n = features['count']
+    spread = n * sums['xx'] - sums['x'] ** 2
+    features['slope'] = (n * sums['xy'] - sums['x'] * sums['score']) / spread.where(spread > 0)
+
+    # Scores taken during any of the patient's stays, for the change over the program
+    stays = programs.assign(admission=clean_dates(programs['admission_dt']),
+                            discharge=clean_dates(programs['discharge_dt']))
+    stays = stays.sort_values(['group_identifier', 'admission'], kind='stable')
+    score_stays = long[['group_identifier', 'assessment_date']].reset_index().merge(
+        stays[['group_identifier', 'admission', 'discharge']], on='group_identifier')
+    during = (score_stays['assessment_date'] >= score_stays['admission']) & \
+             ((score_stays['assessment_date'] <= score_stays['discharge']) | score_stays['discharge'].isna())
+    in_program = long[long.index.isin(score_stays.loc[during, 'index'])]
+    window = in_program.groupby(keys)['score'].agg(['first', 'last', 'count']).reindex(features.index)
+    features['change'] = (window['last'] - window['first']).where(window['count'] >= 2)
+
+    wide = features[feature_names].unstack('assessment')
+    wide = wide.reindex(columns=[(feature, assessment) for assessment in scored for feature in feature_names])
+    wide.columns = [f"{assessment}_{feature}" for feature, assessment in wide.columns]
+    wide = wide.reset_index()
+
+    # One row per patient, combining the stays of readmitted patients
+    stays['days_in_program'] = (stays['discharge'] - stays['admission']).dt.days
+    # Taken from the first and latest stay rows as they are; first and last
+    # would skip an empty discharge and report an ongoing stay as finished
+    by_patient = stays.groupby('group_identifier')
+    first_stays = by_patient.head(1).set_index('group_identifier')
+    latest_stays = by_patient.tail(1).set_index('group_identifier')
+    patients = pd.DataFrame({'program': latest_stays['program'],
+                             'discharge_type': latest_stays['discharge_type'],
+                             'admission_dt': first_stays['admission_dt'],
+                             'discharge_dt': latest_stays['discharge_dt'],
+                             'days_in_program': by_patient['days_in_program'].sum(min_count=1),
+                             'stays': by_patient.size()})
+    patients.index.name = 'group_identifier'
+
+    return patients.reset_index().merge(wide, on='group_identifier')
+
+def build_statistical_datasets(assessments_dict, clinical):
+    """
+    Scores the assessments once and builds both outputs from those scores, as
+    {'stat_tests_data': build_statistical_dataset's table,
+     'longitudinal_features': build_longitudinal_features' table}.
+    """
+    scored = score_assessments(assessments_dict)
+    programs = clinical_programs(clinical)
+    return {'stat_tests_data': program_means(scored, programs),
+            'longitudinal_features': build_longitudinal_features(scored, programs)}
+
+def build_statistical_dataset(assessments_dict, clinical):
+    """
+    Builds the statistical tests dataset: each patient's mean score on every
+    assessment, with their program and discharge type from the clinical data
+    report.
+
+    assessments_dict maps WHO, GAD, PHQ, PCL, DERS and DERS2 to their merged
+    tables (as load_merged_assessments reads them, or straight from the
+    merger); clinical is the clinical data report or its path. Scores come
+    from each table's item columns (see common/assessment_scoring.py), and
+    a table whose items do not match its assessment raises ValueError.
+    """
+    return program_means(score_assessments(assessments_dict), clinical_programs(clinical))
+
+def write_statistical_datasets(datasets, output_folder, output_format="csv"):
+    """Writes each table from build_statistical_datasets under its name; returns the paths written."""
+    return [write_table(df, format_output_path(output_folder, name, output_format), output_format)
+            for name, df in datasets.items()]
+
 def create_statistical_dataset():
     try:
         if not input_path or not output_path or not clinical_path:
             messagebox.showwarning("Missing Selection", "Please select input folder, output folder, and clinical CSV first.")
             return
 
-        folder_path = input_path
-        csv_files = glob(os.path.join(folder_path, '*.csv'))
-
-        assessments_dict = dict()
-
-        for file_path in csv_files:
-            file_name = os.path.basename(file_path).lower()
-            df = pd.read_csv(file_path)
-
-            if 'who_merged' in file_name:
-                assessments_dict['WHO'] = df
-            elif 'gad_merged' in file_name:
-                assessments_dict['GAD'] = df
-            elif 'phq_merged' in file_name:
-                assessments_dict['PHQ'] = df
-            elif 'ptsd_merged' in file_name or 'pcl' in file_name:
-                assessments_dict['PCL'] = df
-            elif 'ders2_merged' in file_name:
-                assessments_dict['DERS2'] = df
-            elif 'ders_merged' in file_name:
-                assessments_dict['DERS'] = df
-
-        required = ['WHO', 'GAD', 'PHQ', 'PCL', 'DERS', 'DERS2']
-        for r in required:
-            if r not in assessments_dict:
-                raise ValueError(f"Missing assessment file: {r}")
-
-        df_who = assessments_dict['WHO']
-        df_gad = assessments_dict['GAD']
-        df_phq = assessments_dict['PHQ']
-        df_pcl = assessments_dict['PCL']
-        df_ders = assessments_dict['DERS']
-        df_ders2 = assessments_dict['DERS2']
-
-        df_clinical = pd.read_csv(clinical_path)
-
-        df_who['assessment_date'] = clean_dates(df_who['assessment_date'])
-        df_who['score'] = df_who.iloc[:, -5:].sum(axis=1)
-
-        df_gad['assessment_date'] = clean_dates(df_gad['assessment_date'])
-        if '5. * Being so restless that it’s hard to sit still' in df_gad.columns:
-            df_gad['5. * Being so restless that it is too hard to sit still'] = df_gad['5. * Being so restless that it is too hard to sit still'].combine_first(
-                df_gad['5. * Being so restless that it’s hard to sit still'])
-            df_gad.drop('5. * Being so restless that it’s hard to sit still', axis=1, inplace=True)
-        df_gad['score'] = df_gad.iloc[:, -7:].sum(axis=1)
-
-        df_phq['assessment_date'] = clean_dates(df_phq['assessment_date'])
-        df_phq['score'] = df_phq.iloc[:, -9:].sum(axis=1)
-
-        df_pcl['assessment_date'] = clean_dates(df_pcl['assessment_date'])
-        df_pcl['score'] = df_pcl.iloc[:, -20:].sum(axis=1)
-
-        df_ders['assessment_date'] = clean_dates(df_ders['assessment_date'])
-        df_ders['score'] = df_ders.iloc[:, -36:].sum(axis=1)
-
-        df_ders2['assessment_date'] = clean_dates(df_ders2['assessment_date'])
-        reverse_cols2 = df_ders2.loc[:, df_ders2.columns.str.split('.').str[0].isin([str(x) for x in [1,2,6,7,8,10,17,20,22,24,34]])].columns
-        df_ders2[reverse_cols2] = df_ders2[reverse_cols2].replace({"'-1":1,"'-2":2,"'-3":3,"'-4":4,"'-5":5})
-        df_ders2['score'] = df_ders2.iloc[:, -36:].sum(axis=1)
-        df_ders2.columns = df_ders.columns
-        df_ders = pd.concat([df_ders, df_ders2])
-
-        cols = ['group_identifier', 'assessment_date', 'score']
-        assessments = ['WHO', 'GAD', 'PHQ', 'PCL', 'DERS']
-
-        df_merge = df_who[cols].merge(df_gad[cols], how='outer', on=['group_identifier', 'assessment_date'], suffixes=('_WHO', '_GAD'))
-        df_merge = df_merge.merge(df_phq[cols], how='outer', on=['group_identifier', 'assessment_date'], suffixes=(None, '_PHQ'))
-        df_merge = df_merge.merge(df_pcl[cols], how='outer', on=['group_identifier', 'assessment_date'], suffixes=(None, '_PCL'))
-        df_merge = df_merge.merge(df_ders[cols], how='outer', on=['group_identifier', 'assessment_date'], suffixes=(None, '_DERS'))
-        df_merge.columns = ['group_identifier', 'assessment_date'] + assessments
-        scores = df_merge.groupby('group_identifier')[assessments].mean().reset_index()
-
-        sub_clinical = df_clinical[['MR','Admission Date','Discharge Date','Program','Discharge Type']]
-        sub_clinical = sub_clinical.rename(columns={'MR':'patient_ID'})
-        sub_clinical['group_identifier'] = sub_clinical['patient_ID'].apply(lambda x: pseudonymize_function(x) if pd.notnull(x) else None)
-        sub_clinical.drop(columns='patient_ID', inplace=True)
-
-        df_program = scores.merge(sub_clinical, on='group_identifier')
-        df_program = df_program.rename(columns={'Admission Date':'admission_dt', 'Discharge Date':'discharge_dt', 'Program':'program', 'Discharge Type':'discharge_type'})
-
-        df_program['program'] = df_program['program'].replace({
-            'Mental Health PHP': 'Mental Health',
-            'Mental Health IOP': 'Mental Health',
-            'Substance Use PHP': 'Substance Use',
-            'Substance Use IOP': 'Substance Use'
-        })
-        df_program['discharge_type'] = df_program['discharge_type'].replace({
-            'Treatment Complete - Successful Discharge': 'Successful Discharge',
-            'ATA - Unsuccessful Discharge':'Unsuccessful Discharge',
-            'Unauthorized Absences - Unsuccessful Discharge':'Unsuccessful Discharge',
-            'Transfer and Referrals - Involuntary Discharge':'Involuntary Discharge',
-            'Administrative Discharge - Involuntary Discharge':'Involuntary Discharge'
-        })
-
-        output_path_final = os.path.join(output_path, 'stat_tests_data.csv')
-        df_program.to_csv(output_path_final, index=False)
-
-        messagebox.showinfo("Success", f"Statistical dataset created!\nSaved at:\n{output_path_final}")
+        datasets = build_statistical_datasets(load_merged_assessments(input_path), clinical_path)
+        output_paths = write_statistical_datasets(datasets, output_path, output_format.get())
+
+        messagebox.showinfo("Success", "Statistical dataset created!\nSaved at:\n" + "\n".join(output_paths))
 
     except Exception as e:
         messagebox.showerror("Error", f"Error creating dataset:\n{str(e)}")
@@ -160,7 +252,7 @@ def create_gui():
 
     root = tk.Tk()
     root.title("Statistical Dataset Builder")
-    root.geometry("600x450")
+    root.geometry("600x490")
 
     tk.Label(root, text="Step 1: Choose Input Files", font=("Arial", 12)).pack(pady=10)
 
@@ -176,11 +268,52 @@ def create_gui():
     output_label = tk.Label(root, text="Output: Not selected", font=("Helvetica", 10))
     output_label.pack()
 
+    global output_format
+    output_format = tk.StringVar(value="csv")
+    format_frame = tk.Frame(root)
+    format_frame.pack(pady=5)
+    tk.Label(format_frame, text="Output format:").pack(side="left")
+    for fmt in OUTPUT_FORMATS:
+        tk.Radiobutton(format_frame, text=fmt.upper(), variable=output_format, value=fmt).pack(side="left")
+
     tk.Label(root, text="Step 2: Create Combined Dataset", font=("Arial", 12)).pack(pady=20)
 
     tk.Button(root, text="Create Stat Tests Dataset", command=create_statistical_dataset, bg="blue", fg="black", height=2).pack(pady=10)
 
     root.mainloop()
 
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description="Build the statistical tests dataset without the GUI. Run with no arguments to open the GUI.")
+    source = arg_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--merged", help="folder of *_merged files written by the Assessment Merger")
+    source.add_argument("--exports", help="folder of assessment exports to merge first, in memory")
+    arg_parser.add_argument("--clinical", required=True, help="clinical data report CSV")
+    arg_parser.add_argument("--output", required=True, help="folder to write stat_tests_data and longitudinal_features to")
+    arg_parser.add_argument("--format", default="csv", choices=OUTPUT_FORMATS, help="output file format")
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="worker processes for reading the exports")
+    arg_parser.add_argument("--save-merged", action="store_true",
+                            help="with --exports, also write the *_merged files to the output folder")
+    args = arg_parser.parse_args(argv)
+
+    os.makedirs(args.output, exist_ok=True)
+    if args.exports:
+        from assessment_merger import merge_all_assessments, write_merged_tables
+        merged = merge_all_assessments(args.exports, workers=args.workers)
+        if args.save_merged:
+            write_merged_tables(merged, args.output, args.format)
+        assessments_dict = {'PCL' if assessment == 'PTSD' else assessment: as_read_from_csv(df)
+                            for assessment, df in merged.items()}
+    else:
+        assessments_dict = load_merged_assessments(args.merged)
+
+    datasets = build_statistical_datasets(assessments_dict, args.clinical)
+    for path in write_statistical_datasets(datasets, args.output, args.format):
+        print(f"Statistical dataset saved at: {path}")
+    return 0
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(main())
     create_gui()
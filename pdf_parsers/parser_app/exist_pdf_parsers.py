@@ -1,81 +1,228 @@
-import fitz
 import re
 import os
+import sys
+import json
+import time
+import argparse
 import PyPDF2
+import numpy as np
 import pandas as pd
-import pdfplumber  
 from datetime import datetime
 import logging
-import tkinter as tk
-from tkinter import filedialog, messagebox
-import hashlib
+try:
+    import tkinter as tk
+    from tkinter import filedialog, messagebox
+except ImportError:
+    # Headless installs run the parsers from the command line only
+    tk = filedialog = messagebox = None
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial, lru_cache
+import difflib
+from pdf_document import PdfDocument
+from extraction_cache import get_cache, delete_cache, DEFAULT_CACHE_PATH
+from keyword_matcher import KeywordMatcher
+from parse_manifest import load_manifest, save_manifest, find_changed_files, upsert_file_rows
+from parse_timing import RunTimings, timed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from pseudonymize import pseudonymize
+
+# Logging is set up by the command line and GUI entry points, not on import;
+# DEBUG also turns on pdfminer's per-object logging, which slows parsing down
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+DEFAULT_LOG_LEVEL = "WARNING"
+
+def setup_logging(level=DEFAULT_LOG_LEVEL):
+    logging.basicConfig(level=getattr(logging, level.upper()), force=True)
 
-# Set up basic logging
-logging.basicConfig(level=logging.DEBUG)
-
-name_mapping = dict()
+#############################################
+# Batch Helpers Shared by All Parsers       #
+#############################################
 
-SECRET_KEY = "XXXXXXXXXXXXXXXXX"
+def extract_patient_id(filename):
+    # Look for this pattern in the filename LO-YYYY-XX
+    match = re.search(r'_(LO-\d{4}-\d{1,3})_', filename.upper())
+    if match:
+        return match.group(1)
+    return filename  # fallback
+
+def list_pdf_files(input_folder):
+    """Returns the PDF filenames in a folder, sorted so row order is deterministic."""
+    return sorted(f for f in os.listdir(input_folder) if f.endswith(".pdf"))
+
+def parse_pdf_file(parse_file, cache_path, pdf_path, group_identifier):
+    """
+    Opens the PDF once and hands the loaded document to parse_file. Returns
+    the records along with a timing trace of the file; time not spent in a
+    PdfDocument stage is counted as regex field extraction.
+    """
+    start = time.perf_counter()
+    cache = get_cache(cache_path) if cache_path else None
+    with PdfDocument(pdf_path, cache=cache) as doc:
+        records = parse_file(doc, group_identifier)
+    seconds = time.perf_counter() - start
+    stages = dict(doc.timer.stages)
+    stages["fields"] = max(0.0, seconds - sum(stages.values()))
+    trace = {"file": doc.filename, "bytes": len(doc.data), "pages": doc.page_count,
+             "cached": doc.from_cache, "seconds": seconds, "stages": stages}
+    return records, trace
+
+def iter_file_parser(parse_file, input_folder, workers=None, cache_path=None, files=None, progress=None,
+                     timings=None):
+    """
+    Runs parse_file(doc, group_identifier) on every PDF in the folder, where
+    doc is the PdfDocument loaded for that file, yielding each file's records.
+
+    Group identifiers are computed here in the parent process, so every worker
+    receives the same pseudonyms no matter which process parses the file.
+    With workers > 1 the files are fanned out across a ProcessPoolExecutor;
+    results always come out in filename order, one list of records per file.
+    If cache_path is set, extracted page text and tables are read from and
+    written to the extraction cache there, so unchanged PDFs are not re-parsed.
+    files optionally restricts the run to a subset of the folder's PDFs, and
+    progress, if given, is called as progress(done, total, filename) after
+    each file, and each file's timing trace is added to timings if given.
+    """
+    filenames = list_pdf_files(input_folder) if files is None else sorted(files)
+    pdf_paths = [os.path.join(input_folder, filename) for filename in filenames]
+    group_ids = [pseudonymize(extract_patient_id(filename)) for filename in filenames]
+
+    parse_one = partial(parse_pdf_file, parse_file, cache_path)
+
+    def collect(results):
+        for done, (filename, (records, trace)) in enumerate(zip(filenames, results), start=1):
+            if timings is not None:
+                timings.add_file(trace)
+            if progress:
+                progress(done, len(filenames), filename)
+            yield records
+
+    if not workers or workers <= 1 or len(pdf_paths) <= 1:
+        yield from collect(map(parse_one, pdf_paths, group_ids))
+        return
 
-def pseudonymize_function(patient_id):
-    if patient_id not in name_mapping:
-        hash_input = (SECRET_KEY + patient_id).encode()
-        hashed_value = hashlib.sha256(hash_input).hexdigest()[:12]
-        name_mapping[patient_id] = f"{hashed_value}"
-    return name_mapping[patient_id]
+    chunksize = max(1, len(pdf_paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from collect(executor.map(parse_one, pdf_paths, group_ids, chunksize=chunksize))
+
+def run_file_parser(parse_file, input_folder, workers=None, cache_path=None, files=None, progress=None,
+                    timings=None):
+    """Like iter_file_parser, but returns the per-file records as a list."""
+    return list(iter_file_parser(parse_file, input_folder, workers, cache_path, files, progress, timings))
+
+def parse_with_all(parse_files, doc, group_identifier):
+    """Runs several per-file parsers on one loaded document, in order."""
+    return [parse_file(doc, group_identifier) for parse_file in parse_files]
+
+def flatten_records(per_file_records):
+    return [record for records in per_file_records for record in records]
+
+# Rows per DataFrame chunk when an output is streamed to CSV
+CSV_CHUNK_SIZE = 5000
+
+class ChunkedCsvWriter:
+    """
+    Collects rows and writes them to a CSV one DataFrame chunk at a time.
+
+    build_frame turns a list of rows into a DataFrame with the output's
+    columns; only the first chunk writes the header.
+    """
+
+    def __init__(self, out_file, build_frame, chunk_size=CSV_CHUNK_SIZE):
+        self.out_file = out_file
+        self.build_frame = build_frame
+        self.chunk_size = chunk_size
+        self.pending = []
+        self.rows_written = 0
+        self.header_written = False
+
+    def add(self, rows):
+        self.pending.extend(rows)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending and self.header_written:
+            return
+        df = self.build_frame(self.pending)
+        df.to_csv(self.out_file, mode="a" if self.header_written else "w",
+                  header=not self.header_written, index=False)
+        self.header_written = True
+        self.rows_written += len(self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
 
 #############################################
 # Daily Clinical Card Parser Definitions  #
 #############################################
 
-def process_clinical_card_pdfs(input_folder):
+clinical_card_anchor = re.compile(r'Daily Clinical Card\s+(\d{2}/\d{2}/\d{4})')
+
+def index_clinical_card_pages(doc):
+    """
+    Pre-scans the cheap fitz text of every page and returns
+    [(page_num, assessment_date)] for each page carrying a dated card anchor.
+    """
+    anchors = []
+    for page_num in range(doc.page_count):
+        anchor_match = clinical_card_anchor.search(doc.page_text(page_num))
+        if anchor_match:
+            anchors.append((page_num, anchor_match.group(1)))
+    return anchors
+
+def parse_clinical_card_pdf(doc, group_identifier, all_cards=False):
+    """
+    Reads the emotion, support and coping tables of the Daily Clinical Card.
+
+    pdfplumber table extraction only runs on pages found by the anchor index.
+    By default only the first card in the file is read; with all_cards every
+    dated card becomes its own record.
+    """
     results = []
-    for filename in os.listdir(input_folder):
-        if filename.endswith(".pdf"):
-            match = re.search(r'_(LO-\d{4}-\d{1,3})_', filename.upper())
-            if match:
-                patient_id = match.group(1)
-            else:
-                patient_id = filename
-            group_identifier = pseudonymize_function(patient_id)
-            pdf_path = os.path.join(input_folder, filename)
-
-            with pdfplumber.open(pdf_path) as pdf:
-                found_anchor = False
-                for page in pdf.pages:
-                    text = page.extract_text()
-                    if not text:
-                        continue
-
-                    anchor_match = re.search(r'Daily Clinical Card\s+(\d{2}/\d{2}/\d{4})', text)
-                    if anchor_match:
-                        assessment_date = anchor_match.group(1)
-                        found_anchor = True
-                        tables = page.extract_tables()
-                        if tables and len(tables) >= 3:
-                            record = {
-                                "group_identifier": group_identifier,
-                                "assessment_date": assessment_date
-                            }
-
-                            prefixes = ["emo_", "sup_", "cop_"]  # For tables 1, 2, 3
-
-                            for i in range(3):
-                                try:
-                                    table = tables[i]
-                                    headers = table[0][1:]  # skip first column
-                                    values = table[1][1:]
-                                    section_data = {}
-                                    for key, value in zip(headers, values):
-                                        clean_key = key.strip().replace('\n', ' ').strip()
-                                        section_data[f"{prefixes[i]}{clean_key}"] = int(value)
-                                    record.update(section_data)
-                                except Exception as e:
-                                    logging.warning(f"Table {i+1} in {filename} failed to parse: {e}")
-                            results.append(record)
-                        break  # Stop after first match
+    anchors = index_clinical_card_pages(doc)
+    if not all_cards:
+        anchors = anchors[:1]  # Stop after first match
+
+    for page_num, assessment_date in anchors:
+        tables = doc.tables(page_num)
+        if tables and len(tables) >= 3:
+            record = {
+                "group_identifier": group_identifier,
+                "assessment_date": assessment_date
+            }
+
+            prefixes = ["emo_", "sup_", "cop_"]  # For tables 1, 2, 3
+
+            for i in range(3):
+                try:
+                    table = tables[i]
+                    headers = table[0][1:]  # skip first column
+                    values = table[1][1:]
+                    section_data = {}
+                    for key, value in zip(headers, values):
+                        clean_key = key.strip().replace('\n', ' ').strip()
+                        section_data[f"{prefixes[i]}{clean_key}"] = int(value)
+                    record.update(section_data)
+                except Exception as e:
+                    logging.warning(f"Table {i+1} in {doc.filename} failed to parse: {e}")
+            results.append(record)
+    return results
+
+parse_all_clinical_cards_pdf = partial(parse_clinical_card_pdf, all_cards=True)
+
+def build_clinical_card_frame(results):
     return pd.DataFrame(results)
 
+def process_clinical_card_pdfs(input_folder, workers=None, cache_path=None, files=None, all_cards=False,
+                               timings=None):
+    parse_file = parse_all_clinical_cards_pdf if all_cards else parse_clinical_card_pdf
+    per_file = run_file_parser(parse_file, input_folder, workers, cache_path, files, timings=timings)
+    with timed(timings, "frame"):
+        return build_clinical_card_frame(flatten_records(per_file))
+
 #############################################
 # PHP Daily Assessments Parser Definitions  #
 #############################################
@@ -125,82 +272,117 @@ def extract_cravings_rating(text):
         return int(match.group(1))
     return None
 
+# Compiled once; scans an assessment a single time for all three keyword sets
+php_keyword_matcher = KeywordMatcher({
+    "emotions": emotion_keywords,
+    "skills": skills_keywords,
+    "supports": supports_keywords,
+})
+
 def check_supports(text):
-    support_found = {}
-    support_matched_words = []
-    for supp, words in supports_keywords.items():
-        found = [word for word in words if re.search(rf"\b{word}\b", text, re.IGNORECASE)]
-        support_found[supp] = bool(found)
-        support_matched_words.extend(found)
-    return support_found, ", ".join(set(support_matched_words))
+    return php_keyword_matcher.match(text)["supports"]
 
 def check_skills(text):
-    skills_found = {}
-    skill_matched_words = []
-    for skill, words in skills_keywords.items():
-        found = [word for word in words if re.search(rf"\b{word}\b", text, re.IGNORECASE)]
-        skills_found[skill] = bool(found)
-        skill_matched_words.extend(found)
-    return skills_found, ", ".join(set(skill_matched_words))
+    return php_keyword_matcher.match(text)["skills"]
 
 def check_emotions(text):
-    emotions_found = {}
-    emotion_matched_words = []
-    for emotion, words in emotion_keywords.items():
-        found = [word for word in words if re.search(rf"\b{word}\b", text, re.IGNORECASE)]
-        emotions_found[emotion] = bool(found)
-        emotion_matched_words.extend(found)
-    return emotions_found, ", ".join(set(emotion_matched_words))
+    return php_keyword_matcher.match(text)["emotions"]
 
 def extract_text_from_pdf(pdf_path):
-    with fitz.open(pdf_path) as doc:
-        text = "\n".join([page.get_text("text") for page in doc])
+    with PdfDocument(pdf_path) as doc:
+        text = doc.full_text("\n")
     return text
 
+php_assessment_pattern = re.compile(
+    r"PHP Daily Assessment (\d{2}/\d{2}/\d{4}) \d{2}:\d{2} [APM]{2}\n(.*?)(?=\n\w+ \w+, ACSW\d+)",
+    re.DOTALL
+)
+php_header_pattern = re.compile(r"PHP Daily Assessment \d{2}/\d{2}/\d{4} \d{2}:\d{2} [APM]{2}\n")
+
 def extract_php_assessments(text):
-    pattern = re.findall(
-        r"PHP Daily Assessment (\d{2}/\d{2}/\d{4}) \d{2}:\d{2} [APM]{2}\n(.*?)(?=\n\w+ \w+, ACSW\d+)",
-        text,
-        re.DOTALL
-    )
+    pattern = php_assessment_pattern.findall(text)
     return pattern
 
-def process_php_pdfs(input_folder):
-    all_data = []
-    for filename in os.listdir(input_folder):
-        if filename.endswith(".pdf"):
-            pdf_path = os.path.join(input_folder, filename)
-            pdf_text = extract_text_from_pdf(pdf_path)
-            match = re.search(r'_(LO-\d{4}-\d{1,3})_', filename.upper())
-            if match:
-                patient_id = match.group(1)
-            else:
-                patient_id = filename  # fallback
-            group_identifier = pseudonymize_function(patient_id)
-            assessments = extract_php_assessments(pdf_text)
-            for date, text in assessments:
-                crave_rating = extract_cravings_rating(text)
-                emotions_found, emotion_matched_words = check_emotions(text)
-                skills_found, skill_matched_words = check_skills(text)
-                supports_found, support_matched_words = check_supports(text)
-                row_data = [
-                    group_identifier,
-                    date,
-                    emotion_matched_words,
-                    skill_matched_words,
-                    support_matched_words,
-                    crave_rating
-                ] + list(emotions_found.values()) + list(skills_found.values()) + list(supports_found.values())
-                all_data.append(row_data)
-    columns = (["group_identifier", "assessment_date",
+def iter_php_assessments(page_texts):
+    """
+    Yields (date, text) for each PHP assessment as pages are read.
+
+    Gives the same assessments as extract_php_assessments on the pages joined
+    with newlines, but only keeps the text of the assessment still open, so an
+    assessment that runs over a page boundary is completed by the next page.
+    """
+    buffer = None
+    for page_text in page_texts:
+        buffer = page_text if buffer is None else buffer + "\n" + page_text
+        pos = 0
+        while True:
+            match = php_assessment_pattern.search(buffer, pos)
+            if not match:
+                break
+            yield match.groups()
+            pos = match.end()
+
+        # Keep from the first unfinished assessment, or else just the last
+        # line in case a header is cut off by the page break
+        header = php_header_pattern.search(buffer, pos)
+        keep_from = header.start() if header else max(pos, buffer.rfind("\n") + 1)
+        buffer = buffer[keep_from:]
+
+def iter_php_rows(doc, group_identifier):
+    page_texts = (doc.page_text(page_num) for page_num in range(doc.page_count))
+    for date, text in iter_php_assessments(page_texts):
+        crave_rating = extract_cravings_rating(text)
+        keyword_matches = php_keyword_matcher.match(text)
+        emotions_found, emotion_matched_words = keyword_matches["emotions"]
+        skills_found, skill_matched_words = keyword_matches["skills"]
+        supports_found, support_matched_words = keyword_matches["supports"]
+        row_data = [
+            group_identifier,
+            date,
+            emotion_matched_words,
+            skill_matched_words,
+            support_matched_words,
+            crave_rating
+        ] + list(emotions_found.values()) + list(skills_found.values()) + list(supports_found.values())
+        yield row_data
+
+def parse_php_pdf(doc, group_identifier):
+    return list(iter_php_rows(doc, group_identifier))
+
+php_columns = (["group_identifier", "assessment_date",
                 "Matched Emotion Words", "Match Skill Words", "Match Support Words",
                 "Craving"] +
                list(emotion_keywords.keys()) +
                list(skills_keywords.keys()) +
                list(supports_keywords.keys()))
-    df = pd.DataFrame(all_data, columns=columns)
+
+def build_php_frame(all_data):
+    df = pd.DataFrame(all_data, columns=php_columns)
+    # Nullable ints keep ratings formatted the same in every streamed chunk
+    df["Craving"] = df["Craving"].astype("Int64")
     return df
 
+def process_php_pdfs(input_folder, workers=None, cache_path=None, files=None, timings=None):
+    per_file = run_file_parser(parse_php_pdf, input_folder, workers, cache_path, files, timings=timings)
+    with timed(timings, "frame"):
+        return build_php_frame(flatten_records(per_file))
+
+def stream_php_rows(input_folder, workers=None, cache_path=None, files=None, timings=None):
+    """Yields PHP assessment rows one at a time, file by file in filename order."""
+    for rows in iter_file_parser(parse_php_pdf, input_folder, workers, cache_path, files, timings=timings):
+        yield from rows
+
+def write_php_csv(input_folder, out_file, workers=None, cache_path=None, files=None, chunk_size=CSV_CHUNK_SIZE,
+                  timings=None):
+    """Streams PHP assessment rows into a CSV in chunks, so memory stays flat."""
+    writer = ChunkedCsvWriter(out_file, build_php_frame, chunk_size)
+    for row in stream_php_rows(input_folder, workers, cache_path, files, timings):
+        with timed(timings, "write"):
+            writer.add([row])
+    with timed(timings, "write"):
+        writer.close()
+    return out_file
+
 ##################################################
 # Biopsychosocial Assessments Parser Definitions #
 ##################################################
@@ -227,12 +409,9 @@ def calculate_age(assessment_date, birthdate):
     age = (assessment_date_dt - birthdate_dt).days // 365
     return age
 
-def extract_motivations(pdf_path):
-    doc = fitz.open(pdf_path)
+def extract_motivations(page_texts):
     extracted_text = ""
-    for page_num in range(doc.page_count):
-        page = doc.load_page(page_num)
-        text = page.get_text("text")
+    for text in page_texts:
         if start_phrase in text and end_phrase in text:
             start_index = text.find(start_phrase) + len(start_phrase)
             end_index = text.find(end_phrase)
@@ -289,459 +468,822 @@ def extract_num_prev_treatments(text):
         return int(match.group(1))
     return None
 
-def process_bps_pdfs(input_folder):
-    data_bps = []
-    for filename in os.listdir(input_folder):
-        if filename.endswith(".pdf"):
-            # Look for this pattern in the filename LO-YYYY-XX
-            match = re.search(r'_(LO-\d{4}-\d{1,3})_', filename.upper())
-            if match:
-                patient_id = match.group(1)
-            else:
-                patient_id = filename  # fallback
-            group_identifier = pseudonymize_function(patient_id)
-            pdf_path = os.path.join(input_folder, filename)
-            ext_motivation, int_motivation = extract_motivations(pdf_path)
-            doc = fitz.open(pdf_path)
-            extracted_text = ""
-            for page_num in range(doc.page_count):
-                page = doc.load_page(page_num)
-                extracted_text += page.get_text("text")
-            bps_scores = extract_bps_scores(extracted_text)
-            assessment_date = extract_assessment_date(extracted_text)
-            birthdate = extract_birthdate(extracted_text)
-            age = calculate_age(assessment_date, birthdate) if (assessment_date and birthdate) else None
-            drugs_of_choice = extract_drugs_of_choice(extracted_text)
-            drug_craving_score = extract_drug_craving_score(extracted_text)
-            num_prev_treatments = extract_num_prev_treatments(extracted_text)
-            result = {
-                "group_identifier": group_identifier,
-                "assmt_dt": assessment_date,
-                "birthdate": birthdate,
-                "age": age,
-                "ext_motivation": ext_motivation,
-                "int_motivation": int_motivation,
-                "num_prev_treatments": num_prev_treatments,
-                "drugs_of_choice": drugs_of_choice,
-                "drug_craving_score": drug_craving_score
-            }
-            result.update(bps_scores)
-            data_bps.append(result)
+def parse_bps_pdf(doc, group_identifier):
+    ext_motivation, int_motivation = extract_motivations(doc.page_texts)
+    extracted_text = doc.full_text()
+    bps_scores = extract_bps_scores(extracted_text)
+    assessment_date = extract_assessment_date(extracted_text)
+    birthdate = extract_birthdate(extracted_text)
+    age = calculate_age(assessment_date, birthdate) if (assessment_date and birthdate) else None
+    drugs_of_choice = extract_drugs_of_choice(extracted_text)
+    drug_craving_score = extract_drug_craving_score(extracted_text)
+    num_prev_treatments = extract_num_prev_treatments(extracted_text)
+    result = {
+        "group_identifier": group_identifier,
+        "assmt_dt": assessment_date,
+        "birthdate": birthdate,
+        "age": age,
+        "ext_motivation": ext_motivation,
+        "int_motivation": int_motivation,
+        "num_prev_treatments": num_prev_treatments,
+        "drugs_of_choice": drugs_of_choice,
+        "drug_craving_score": drug_craving_score
+    }
+    result.update(bps_scores)
+    return [result]
+
+def build_bps_frame(data_bps):
     df_bps = pd.DataFrame(data_bps)
     return df_bps
 
+def process_bps_pdfs(input_folder, workers=None, cache_path=None, files=None, timings=None):
+    per_file = run_file_parser(parse_bps_pdf, input_folder, workers, cache_path, files, timings=timings)
+    with timed(timings, "frame"):
+        return build_bps_frame(flatten_records(per_file))
+
 ###############################################
 # AHCM Parser Definitions  #
 ###############################################
 
-def process_ahcm_pdfs(input_folder):
-    UNWANTED_TEXTS = [
-        "Living Situation", "Food", "Transportation", "Utilities", "Safety",
-        "Financial Strain", "Employment", "Family and Community Support", "Education",
-        "Physical Activity", "Substance Use", "Mental Health", "Disabilities",
-        "Choose all the apply",
-        "Please answer whether the statements were OFTEN, SOMETIMES, or NEVER true for you and your household in the last 12 months.",
-        "Calculate [“number of days” selected] x [“number of minutes” selected] = [number of minutes of exercise per week] 2. Apply the right age threshold: Under 6 years old: You can’t find the physical activity need for people under 6. Age 6 to 17: Less than an average of 60 minutes a day shows an HRSN. Age 18 or older: Less than 150 minutes a week shows an HRSN.",
-        "Some people have made the following statements about their food situation",
-        "Because violence and abuse happens to a lot of people and affects their health",
-        "For example, starting or completing job training or getting a high school diploma, GED or equivalent.",
-        "Point Total:()", "when the numerical values for answers to questions 3-10 are added shows that the person might not be safe.",
-        "A score of 11 or more", "Follow these 2 steps to decide",
-        "The next questions relate to your experience with alcohol, cigarettes, and other drugs",
-        "If you get 3 or more when you add the answers to questions 23a and 23b",
-        "One drink is 12 ounces of beer, 5 ounces of wine, or 1.5 ounces of 80-proof spirits."
-    ]
-
-
-    def clean_text(text):
-        """Cleans extracted text by removing unwanted characters and phrases."""
-        # Remove bullet points and similar characters
-        text = re.sub(r"[•●–\-]+", " ", text)
-
-        # Normalize spacing
-        text = re.sub(r"[\*+»~—]", "", text)
-        text = re.sub(r"(\s)+", " ", text)
-
-        # Remove specific unwanted Kipu-generated phrases
-        text = re.sub(r"Powered by Kipu Systems Page \d+ of \d+", "", text)
-
-        for unwanted in UNWANTED_TEXTS:
-            text = text.replace(unwanted, "")
-
-        return text.strip()
+UNWANTED_TEXTS = [
+    "Living Situation", "Food", "Transportation", "Utilities", "Safety",
+    "Financial Strain", "Employment", "Family and Community Support", "Education",
+    "Physical Activity", "Substance Use", "Mental Health", "Disabilities",
+    "Choose all the apply",
+    "Please answer whether the statements were OFTEN, SOMETIMES, or NEVER true for you and your household in the last 12 months.",
+    "Calculate [“number of days” selected] x [“number of minutes” selected] = [number of minutes of exercise per week] 2. Apply the right age threshold: Under 6 years old: You can’t find the physical activity need for people under 6. Age 6 to 17: Less than an average of 60 minutes a day shows an HRSN. Age 18 or older: Less than 150 minutes a week shows an HRSN.",
+    "Some people have made the following statements about their food situation",
+    "Because violence and abuse happens to a lot of people and affects their health",
+    "For example, starting or completing job training or getting a high school diploma, GED or equivalent.",
+    "Point Total:()", "when the numerical values for answers to questions 3-10 are added shows that the person might not be safe.",
+    "A score of 11 or more", "Follow these 2 steps to decide",
+    "The next questions relate to your experience with alcohol, cigarettes, and other drugs",
+    "If you get 3 or more when you add the answers to questions 23a and 23b",
+    "One drink is 12 ounces of beer, 5 ounces of wine, or 1.5 ounces of 80-proof spirits."
+]
 
-    def extract_text_from_pdf(pdf_path):
-        """Extracts AHCM section text from a partial case file."""
-        try:
-            text = ""
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-
-            # Locate start of AHCM section
-            ahcm_anchor = "Who should use the AHC HRSN Screening Tool?"
-            if ahcm_anchor in text:
-                text = text.split(ahcm_anchor, 1)[1]
-                text = ahcm_anchor + "\n" + text  # Re-attach the anchor at the top
-
-                print(f"✅ AHCM section found in {os.path.basename(pdf_path)}")
-            else:
-                print(f"⚠️ AHCM section NOT found in {os.path.basename(pdf_path)}")
-                return None
+ahcm_column_renames = {
+    'What is your living situation today?': 'living_situation',
+    'think about the place you live. Do you have problems with any of the following?': 'housing_problems',
+    """Within the past 12 months, you worried that your food would run out before you got money to buy more. " Sometimes true 4. Within the past 12 months, the food you bought just didn't last and you didn't have money to get more. " Sometimes true 5. In the past 12 months, has lack of reliable transportation kept you from medical appointments, mettings, work or from getting things needed for daily living?""": "food_insecurity_and_transport_issues",
+    'In the past 12 months has the electric, gas, oil, or water company threatened to shut off services in your home?': 'utility_shutoff_threat',
+    'How often does anyone, including family and friends, physically hurt you?': 'abuse_physical',
+    'How often does anyone, including family and friends, insult or talk down to you?': 'abuse_verbal',
+    'How often does anyone, including family and friends, threaten you with harm?': 'abuse_threats',
+    'How often does anyone, including family and friends, scream or curse at you?': 'abuse_yelling',
+    'How hard is it for you to pay for the very basics like food, housing, medical care, and heating?': 'financial_strain',
+    'Do you want help finding or keeping work or a job?': 'want_work_help',
+    'If for any reason you need help with day to day activities such as bathing, preparing meals, shopping, managing finances, etc., do you get the help you need?': 'need_daily_help',
+    'How often do you feel lonely or isolated from those around you?': 'feel_lonely',
+    'Do you speak a language other than English at home?': 'non_english_at_home',
+    'Do you want help with school or training?': 'want_school_help',
+    'In the last 30 days, other than the activities you did for work, on average, how many days per week did you engage in moderate exercise (like walking fast, running, jogging, dancing, swimming, biking, or other similar activities)?': 'exercise_days_per_week',
+    'On average, how many minutes did you usually spend exercising at this level on one of those days?': 'exercise_minutes_per_day',
+    'Calculate [<number of days= selected] x [<number of minutes= selected] = [number of minutes of exercise per week] 2. Apply the right age threshold: " Under 6 years old: You can9t find the physical activity need for people under 6. " Age 6 to 17: Less than an average of 60 minutes a day shows an HRSN. " Age 18 or older: Less than 150 minutes a week shows an HRSN. . Some of the substances are prescribed by a doctor (like pain medications), but only count those if you have taken them for reasons or in doses other than prescribed. One question is about illicit or illegal drug use, but we only ask in order to identify community services that may be available to help you. 19. How many times in the past 12 months have you had 5 or more drinks in a day (males) or 4 or more drinks in a day (females)?': 'binge_drinking',
+    'How many times in the past 12 months have you used tobacco products (like cigarettes, cigars, snuff, chew, electronic cigarettes)?': 'tobacco_use',
+    'How many times in the past year have you used prescription drugs for non medical reasons?': 'prescription_misuse',
+    'How many times in the past year have you used illegal drugs?': 'illegal_drug_use_count',
+    'Over the past 2 weeks, how often have you been bothered by any of the following problems?': 'mental_health_score',
+    'Stress means a situation in which a person feels tense, restless, nervous, or anxious, or is unable to sleep at night because his or her mind is troubled all the time. Do you feel this kind of stress these days?': 'current_stress',
+    'Because of a physical, mental or emotional condition, do you have serious difficulty concentrating, remembering or making decisions?': 'cognitive_difficulty',
+    'Because of a physical, mental or emotional condition, do you have difficulty doing errands alone such as visiting a doctor\'s office or shopping?': 'errand_difficulty',
+    'Shutoff Notice': 'shutoff_notice'
+}
 
-            return text.strip()
-        except Exception as e:
-            print(f"❌ Error processing {pdf_path}: {e}")
+# Patterns clean_text applies in order; the Kipu page footer and every
+# unwanted phrase are removed together by one alternation, longest first
+ahcm_bullet_pattern = re.compile(r"[•●–\-]+")
+ahcm_symbol_pattern = re.compile(r"[\*+»~—]")
+# Same result as replacing every \s+ run with a space, without rewriting the
+# single spaces that make up most of the matches
+whitespace_pattern = re.compile(r"\s{2,}|[^\S ]")
+ahcm_removal_pattern = re.compile("|".join(
+    [r"Powered by Kipu Systems Page \d+ of \d+"] +
+    [re.escape(unwanted) for unwanted in sorted(UNWANTED_TEXTS, key=len, reverse=True)]
+))
+
+def clean_text(text):
+    """Cleans extracted text by removing unwanted characters and phrases."""
+    # Remove bullet points and similar characters
+    text = ahcm_bullet_pattern.sub(" ", text)
+
+    # Normalize spacing
+    text = ahcm_symbol_pattern.sub("", text)
+    text = whitespace_pattern.sub(" ", text)
+
+    # Remove Kipu page footers and specific unwanted Kipu-generated phrases
+    text = ahcm_removal_pattern.sub("", text)
+
+    return text.strip()
+
+# Joins a list of texts for cleaning; none of the patterns can match it
+text_separator = "\x00"
+
+def clean_texts(texts):
+    """
+    Cleans a list of strings the way the AHCM parser always has: clean_text
+    applied twice, since removing a phrase can leave spaces, or a new phrase,
+    that only the second pass catches.
+
+    The texts are joined into one string, so each pattern runs over all of
+    them at once rather than once per text. Bullets and symbols cannot
+    reappear, so only the spacing and phrase removal are repeated.
+    """
+    if not texts or any(text_separator in text for text in texts):
+        return [clean_text(clean_text(text)) for text in texts]
+    joined = text_separator.join(texts)
+    joined = ahcm_bullet_pattern.sub(" ", joined)
+    joined = ahcm_symbol_pattern.sub("", joined)
+    for _ in range(2):
+        joined = whitespace_pattern.sub(" ", joined)
+        joined = ahcm_removal_pattern.sub("", joined)
+    return [text.strip() for text in joined.split(text_separator)]
+
+def extract_ahcm_text(doc):
+    """Extracts AHCM section text from a partial case file."""
+    try:
+        text = ""
+        for page_num in range(doc.page_count):
+            page_text = doc.plumber_text(page_num)
+            if page_text:
+                text += page_text + "\n"
+
+        # Locate start of AHCM section
+        ahcm_anchor = "Who should use the AHC HRSN Screening Tool?"
+        if ahcm_anchor in text:
+            text = text.split(ahcm_anchor, 1)[1]
+            text = ahcm_anchor + "\n" + text  # Re-attach the anchor at the top
+
+            print(f"✅ AHCM section found in {doc.filename}")
+        else:
+            print(f"⚠️ AHCM section NOT found in {doc.filename}")
             return None
 
-    def extract_text_from_folder(pdf_folder):
-        """Extracts text from all PDFs in a folder."""
-        all_texts = {}  # Dictionary to store PDF filename -> extracted text
-
-        # Loop through all PDFs in the folder
-        for pdf_file in os.listdir(pdf_folder):
-            if pdf_file.endswith(".pdf"):
-                pdf_path = os.path.join(pdf_folder, pdf_file)
-                extracted_text = extract_text_from_pdf(pdf_path)
-                if extracted_text:
-                    all_texts[pdf_file] = extracted_text
-
-        return all_texts  # Returns a dictionary of {pdf_filename: extracted_text}
-
-    def extract_questions_answers(text):
-        """Extracts questions and answers from the extracted text."""
-        # Starting from the first valid question
-        start_section = "1. What is your living situation today?"
-        if start_section in text:
-            text = text.split(start_section, 1)[1]
-            text = start_section + "\n" + text
+        return text.strip()
+    except Exception as e:
+        print(f"❌ Error processing {doc.path}: {e}")
+        return None
 
-        question_pattern = re.compile(r"(\d+)\.\s(.*?\?)\s*(.*?)(?=\n\d+\.|\Z)", re.DOTALL)
+def extract_questions_answers(text):
+    """
+    Extracts questions and answers from the extracted text. They are returned
+    uncleaned; build_ahcm_frame cleans all surveys together.
+    """
+    # Starting from the first valid question
+    start_section = "1. What is your living situation today?"
+    if start_section in text:
+        text = text.split(start_section, 1)[1]
+        text = start_section + "\n" + text
+
+    question_pattern = re.compile(r"(\d+)\.\s(.*?\?)\s*(.*?)(?=\n\d+\.|\Z)", re.DOTALL)
+
+    questions = []
+    answers = []
+
+    for match in question_pattern.finditer(text):
+        q_number, question, answer = match.groups()
+
+        if int(q_number) > 26:
+            break  # Stop at question 26
+
+        question = question.strip()
+        answer = answer.strip()
+
+        # Handling Question 23 sub-questions correctly
+        if q_number == "23":
+            sub_questions = re.findall(r"(a\.)\s*(.*?)\?(.*?)\n(b\.)\s*(.*?)\?(.*?)", clean_text(answer), re.DOTALL)
+            if sub_questions:
+                question = clean_text(question)
+                for sub_q in sub_questions:
+                    questions.append(f"{question} {sub_q[1]}?")
+                    answers.append(clean_text(sub_q[2]))
+
+                    questions.append(f"{question} {sub_q[4]}?")
+                    answers.append(clean_text(sub_q[5]))
+                continue
+
+        questions.append(question)
+        answers.append(answer)
+
+    return pd.DataFrame({"Question": questions, "Answer": answers})
+
+# The AHCM answer helpers below take a whole column and return the cleaned
+# column. Values that are not strings (questions a survey did not have)
+# come back as "" or None, as noted for each helper.
+
+def clean_yes_no_value(values):
+    """Yes / No from a free-text answer, or ""."""
+    lowered = values.str.strip().str.lower()
+    return pd.Series(np.select(
+        [lowered.str.contains("yes", regex=False, na=False), lowered.str.contains("no", regex=False, na=False)],
+        ["Yes", "No"], default=""), index=values.index, dtype=object)
+
+frequency_label_pattern = re.compile(r"^([A-Za-z ]+)\s*\(\d+\)")
+
+def extract_frequency_label(values):
+    """The label of a "Label (n)" frequency answer, such as "Never", or ""."""
+    labels = values.str.strip().str.extract(frequency_label_pattern, expand=False)
+    return labels.str.strip().fillna("").astype(object)
+
+def clean_financial_strain(values):
+    # Remove the leading prompt and strip whitespace; "" when unanswered
+    cleaned = values.str.replace("Would you say it is:", "", regex=False).str.strip()
+    return cleaned.fillna("").astype(object)
+
+def extract_max_minutes(values):
+    """The largest number in each answer, "N/A" above 150, or None."""
+    numbers = values.str.extractall(r"(\d+)")[0].astype(int).groupby(level=0).max()
+    result = pd.Series(None, index=values.index, dtype=object)
+    result[numbers.index] = [number if number <= 150 else "N/A" for number in numbers]
+    # Let pandas infer the column type from the values, as Series.apply did
+    return pd.Series(result.tolist(), index=values.index)
+
+# Normalize and shorten the long living situation answer
+def clean_living_situation(values):
+    lowered = values.str.strip().str.lower()
+    steady = lowered.str.contains("steady place to live", regex=False, na=False)
+    worried = lowered.str.contains("worried", regex=False, na=False)
+    cleaned = np.select(
+        [steady & ~worried,
+         lowered.str.contains("worried about losing it", regex=False, na=False),
+         lowered.str.contains("do not have a steady place to live", regex=False, na=False)],
+        ["Stable housing", "Unstable housing", "Homeless or temporary"],
+        default=None)
+    # Fall back to the lowercased answer, and keep non-string values as they were
+    cleaned = pd.Series(cleaned, index=values.index, dtype=object)
+    cleaned = cleaned.where(cleaned.notna(), lowered.astype(object))
+    return cleaned.where(values.notna(), values)
+
+# Known binge drinking frequency labels, in preferred order of matching
+binge_frequency_labels = [
+    "Daily or Almost Daily",
+    "Weekly",
+    "Monthly",
+    "Once or Twice",
+    "Never"
+]
 
-        questions = []
-        answers = []
+def extract_binge_frequency(values):
+    """The first known frequency label found in each answer, or ""."""
+    lowered = values.str.lower()
+    return pd.Series(np.select(
+        [lowered.str.contains(label.lower(), regex=False, na=False) for label in binge_frequency_labels],
+        binge_frequency_labels, default=""), index=values.index, dtype=object)
+
+def extract_point_total(values):
+    """The n of "Point Total: (n)" as an int, or None."""
+    totals = values.str.extract(r"Point Total:\s*\((\d+)\)", expand=False)
+    totals = [int(total) if isinstance(total, str) else None for total in totals]
+    return pd.Series(totals, index=values.index)
+
+def parse_ahcm_pdf(doc, group_identifier):
+    text = extract_ahcm_text(doc)
+    if not text:
+        return []
+
+    print(f"Extracting Q&A from {doc.filename}...")
+    df = extract_questions_answers(text)
+    return [{
+        "group_identifier": group_identifier,
+        "questions": df['Question'].tolist(),
+        "answers": df['Answer'].tolist(),
+    }]
+
+# A double quote with a space on either side separates values within an answer
+quote_separator_pattern = re.compile(r'(?<= )"(?= )')
+
+# AHCM output schema: one column per recognized question, in survey order,
+# whatever questions the individual casefiles happen to contain
+ahcm_columns = list(dict.fromkeys(ahcm_column_renames.values()))
+
+def normalize_question(question):
+    """Lowercase letters and digits only, so spacing and punctuation differences still match."""
+    return re.sub(r"[^a-z0-9]+", "", question.lower())
+
+ahcm_question_index = {normalize_question(question): column for question, column in ahcm_column_renames.items()}
+
+@lru_cache(maxsize=None)
+def ahcm_column_for(question):
+    """
+    The output column of a cleaned AHCM question, or None if it is not in
+    the schema. Questions that differ slightly from the known wording, such
+    as a typo fixed in a later Kipu template, are matched to the closest
+    known question.
+    """
+    key = normalize_question(question)
+    if key in ahcm_question_index:
+        return ahcm_question_index[key]
+    close = difflib.get_close_matches(key, ahcm_question_index, n=1, cutoff=0.93)
+    return ahcm_question_index[close[0]] if close else None
+
+def build_ahcm_frame(surveys):
+    # Clean the questions and answers of all surveys together
+    questions = clean_texts([q for survey in surveys for q in survey["questions"]])
+    answers = clean_texts([a for survey in surveys for a in survey["answers"]])
+    bounds = np.cumsum([0] + [len(survey["answers"]) for survey in surveys])
+
+    # Place every answer in its question's column. Questions outside the
+    # schema are kept as extra columns named after the question text.
+    columns = list(ahcm_columns)
+    positions = {column: i for i, column in enumerate(columns)}
+    placements = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        survey_placements = {}
+        for i in range(start, end):
+            column = ahcm_column_for(questions[i])
+            if column is None or positions[column] in survey_placements:
+                column = questions[i]
+                if column not in positions:
+                    print(f"⚠️ AHCM question not in the schema, kept as its own column: {column[:80]}")
+                    positions[column] = len(columns)
+                    columns.append(column)
+            survey_placements.setdefault(positions[column], answers[i])
+        placements.append(survey_placements)
+
+    records = np.full((len(surveys), len(columns)), None, dtype=object)
+    for row, survey_placements in enumerate(placements):
+        records[row, list(survey_placements)] = list(survey_placements.values())
+
+    final_df = pd.DataFrame(records, columns=columns)
+    final_df.insert(0, "group_identifier", [survey["group_identifier"] for survey in surveys])
+
+    final_df["living_situation"] = clean_living_situation(final_df["living_situation"])
+    final_df["utility_shutoff_threat"] = clean_yes_no_value(final_df["utility_shutoff_threat"])
+    final_df["abuse_yelling"] = extract_frequency_label(final_df["abuse_yelling"])
+    final_df["abuse_physical"] = extract_frequency_label(final_df["abuse_physical"])
+    final_df["abuse_verbal"] = extract_frequency_label(final_df["abuse_verbal"])
+    final_df["abuse_threats"] = extract_frequency_label(final_df["abuse_threats"])
+    final_df["financial_strain"] = clean_financial_strain(final_df["financial_strain"])
+    final_df["binge_drinking"] = extract_binge_frequency(final_df["binge_drinking"])
+    final_df["exercise_minutes_per_day"] = extract_max_minutes(final_df["exercise_minutes_per_day"])
+    final_df["exercise_days_per_week"] = extract_max_minutes(final_df["exercise_days_per_week"])
+    final_df["mental_health_score"] = extract_point_total(final_df["mental_health_score"])
+    final_df["cognitive_difficulty"] = clean_yes_no_value(final_df["cognitive_difficulty"])
+    final_df["errand_difficulty"] = clean_yes_no_value(final_df["errand_difficulty"])
+
+    # Clean 'housing_problems' column: replace quote separators, remove periods
+    # and trim whitespace, repeated while a pass still changes something
+    if 'housing_problems' in final_df.columns:
+        housing = final_df['housing_problems']
+        while True:
+            cleaned = housing.str.replace(' " ', ' // ', regex=False).str.replace('.', '', regex=False).str.strip()
+            if cleaned.equals(housing):
+                break
+            housing = cleaned
+        final_df['housing_problems'] = housing
 
-        for match in question_pattern.finditer(text):
-            q_number, question, answer = match.groups()
+    for col in final_df.columns:
+        # Replace internal quote-separated values with '//' delimiter
+        final_df[col] = (final_df[col].astype(str)
+                         .str.replace(quote_separator_pattern, '//', regex=True)
+                         .str.lstrip(' " ').str.strip())
 
-            if int(q_number) > 26:
-                break  # Stop at question 26
+    return final_df
 
-            question = clean_text(question.strip())
-            answer = clean_text(answer.strip())
+def process_ahcm_pdfs(input_folder, workers=None, cache_path=None, files=None, timings=None):
+    per_file = run_file_parser(parse_ahcm_pdf, input_folder, workers, cache_path, files, timings=timings)
+    with timed(timings, "frame"):
+        return build_ahcm_frame(flatten_records(per_file))
 
-            # Handling Question 23 sub-questions correctly
-            if q_number == "23":
-                sub_questions = re.findall(r"(a\.)\s*(.*?)\?(.*?)\n(b\.)\s*(.*?)\?(.*?)", answer, re.DOTALL)
-                if sub_questions:
-                    for sub_q in sub_questions:
-                        questions.append(f"{question} {sub_q[1]}?")
-                        answers.append(clean_text(sub_q[2]))
+###############################################
+# Substance Abuse History Parser Definitions  #
+###############################################
 
-                        questions.append(f"{question} {sub_q[4]}?")
-                        answers.append(clean_text(sub_q[5]))
-                    continue
+substance_section_heading = "IV. SUBSTANCE USE HISTORY & ASSESSMENT"
+# An upper-case section heading on a line of its own, numbered with a Roman
+# numeral, such as "V. MENTAL HEALTH HISTORY"; "IV." or "V." inside a
+# sentence does not match
+section_heading_pattern = re.compile(r"^[ \t]*[IVXL]+\.[ \t]+[A-Z][A-Z &/,'()-]*[ \t]*$", re.MULTILINE)
+
+def find_section_pages(doc, heading):
+    """
+    (first, last) page numbers of the section that starts with heading, from
+    the fitz page text, or None if the heading is not found. The section ends
+    at the next section heading; that page is only included if the section
+    still has text above the next heading.
+    """
+    first = None
+    for page_num in range(doc.page_count):
+        text = doc.page_text(page_num)
+        search_from = 0
+        if first is None:
+            position = text.find(heading)
+            if position < 0:
+                continue
+            first = page_num
+            search_from = position + len(heading)
+        next_heading = section_heading_pattern.search(text, search_from)
+        if next_heading:
+            if page_num > first and not text[:next_heading.start()].strip():
+                return first, page_num - 1
+            return first, page_num
+    if first is None:
+        return None
+    return first, doc.page_count - 1
+
+def parse_substance_history_pdf(doc, group_identifier):
+    # Only ask pdfplumber for tables on the pages of the substance use section
+    section_pages = find_section_pages(doc, substance_section_heading)
+    substance_tables = []
+    if section_pages:
+        first, last = section_pages
+        for page_num in range(first, last + 1):
+            table = doc.table(page_num)
+            if table:
+                substance_tables.append(table)
+        print(f"✅ Substance use section on pages {first + 1}-{last + 1} of {doc.filename}, "
+              f"{doc.page_count - (last - first + 1)} pages skipped")
+    else:
+        print(f"⚠️ Substance use section NOT found in {doc.filename}")
 
-            questions.append(question)
-            answers.append(answer)
+    # Flatten all found tables
+    flat_table = []
+    for table in substance_tables:
+        flat_table.extend(table)
 
-        return pd.DataFrame({"Question": questions, "Answer": answers})
+    result = {
+        "group_identifier": group_identifier,
+        "found_substance_section": section_pages is not None,
+        "substance_table": flat_table if flat_table else None,
+    }
+    return [result]
+
+# Columns of the section IV substance use table, in order
+substance_table_columns = ["substance", "first_used", "last_used", "frequency_duration",
+                           "amount", "method", "pattern_of_use"]
+
+# Consolidated categories for the free-text pattern of use
+pattern_of_use_mapping = {
+    'continued': 'Continued',
+    'contunued': 'Continued',
+    'Binge, continued': 'Binge/Continued',
+    'Binge episodes': 'Binge/Episodic',
+    'binge/episodic': 'Binge/Episodic',
+    'episodic': 'Binge/Episodic',
+    'Episodic/binge': 'Binge/Episodic',
+    'Episodic or binge': 'Binge/Episodic',
+    'Binge': 'Binge/Episodic',
+    'Binges': 'Binge/Episodic',
+    'experimental': 'Experimental',
+    'social': 'Experimental',
+    'socially': 'Experimental',
+    'recreational': 'Experimental',
+    'recreationally': 'Experimental',
+    'daily': 'Daily',
+    'NA': 'NA',
+    'N/A': 'NA',
+    'prescribed prn': 'Prescribed',
+    'as prescribed for sleep': 'Prescribed',
+    'for surgery': 'Prescribed',
+    'once in a while': 'Experimental',
+    'mental and emotional': 'Prescribed',
+    'ocationally': 'Occasionally',
+    'trail': 'Experimental'
+}
 
-    def clean_yes_no_value(value):
-        if not isinstance(value, str):
-            return ""
+# Looked up by the trimmed, lowercased answer so "Daily", "daily " and
+# "DAILY" all consolidate the same way
+pattern_of_use_lookup = {pattern.lower(): category for pattern, category in pattern_of_use_mapping.items()}
+
+def consolidate_pattern_of_use(values):
+    """The consolidated category of each pattern of use, or the answer itself when unknown."""
+    return values.str.strip().str.lower().map(pattern_of_use_lookup).fillna(values)
+
+def is_used(values):
+    return values.notna() & (values != 'NA') & (values.str.strip() != '')
+
+def build_substance_history_frame(data):
+    # Gather the table rows below each header row, and who they belong to.
+    # Short rows are padded with None, and cells past the pattern of use dropped.
+    width = len(substance_table_columns)
+    group_ids = []
+    table_rows = []
+    for record in data:
+        substance_table = record['substance_table']
+        if substance_table:
+            group_ids.extend([record['group_identifier']] * (len(substance_table) - 1))
+            table_rows.extend(list(row[:width]) + [None] * (width - len(row)) for row in substance_table[1:])
 
-        value = value.strip().lower()
+    if not table_rows:
+        return pd.DataFrame()  # Return an empty DataFrame if no data was flattened
 
-        if "yes" in value:
-            return "Yes"
-        elif "no" in value:
-            return "No"
-        else:
-            return ""
-
-    def process_pdfs_in_folder(pdf_folder):
-        """Processes all PDFs in a folder, extracting questions and answers."""
-        all_pdfs_text = extract_text_from_folder(pdf_folder)
-
-        all_results = {}
-
-        for pdf_filename, text in all_pdfs_text.items():
-            print(f"Extracting Q&A from {pdf_filename}...")
-            df = extract_questions_answers(text)
-            all_results[pdf_filename] = df
-
-        return all_results
-        
-    all_pdf_data = process_pdfs_in_folder(input_folder)
-
-    def extract_frequency_label(text):
-        if not isinstance(text, str):
-            return ""
-        
-        match = re.match(r"([A-Za-z ]+)\s*\(\d+\)", text.strip())
-        if match:
-            return match.group(1).strip()
-        return ""
-
-    def clean_financial_strain(text):
-        if not isinstance(text, str):
-            return ""
-        
-        # Remove the leading prompt and strip whitespace
-        return text.replace("Would you say it is:", "").strip()
-
-
-    def extract_max_minutes(text):
-        if not isinstance(text, str):
-            return None
+    table_df = pd.DataFrame(table_rows, columns=substance_table_columns)
 
-        numbers = re.findall(r"\d+", text)
-        if numbers:
-            max_val = max(map(int, numbers))
-            return max_val if max_val <= 150 else "N/A"
-        return None
+    sparse_df = pd.DataFrame({
+        'group_identifier': group_ids,
+        'substance': table_df['substance'],
+        # Flag substances with a first or last used date
+        'use_flag': (is_used(table_df['first_used']) | is_used(table_df['last_used'])).astype(int),
+        'pattern_of_use': table_df['pattern_of_use'],
+    })
+    sparse_df['pattern_of_use_consolidated'] = consolidate_pattern_of_use(sparse_df['pattern_of_use'])
+    return sparse_df
 
-    # Normalize and shorten the long living situation answer
-    def clean_living_situation(val):
-        if not isinstance(val, str):
-            return val
-        val = val.strip().lower()
-
-        if 'steady place to live' in val and 'worried' not in val:
-            return 'Stable housing'
-        elif 'worried about losing it' in val:
-            return 'Unstable housing'
-        elif 'do not have a steady place to live' in val:
-            return 'Homeless or temporary'
-        
-        return val  # fallback
-
-    def extract_binge_frequency(text):
-        if not isinstance(text, str):
-            return ""
-        
-        # List of known frequency labels in preferred order of matching
-        frequency_labels = [
-            "Daily or Almost Daily",
-            "Weekly",
-            "Monthly",
-            "Once or Twice",
-            "Never"
-        ]
-
-        # Check if any known frequency label is present
-        for label in frequency_labels:
-            if label.lower() in text.lower():
-                return label  # Return the standardized version
-        return ""
-
-
-    def extract_point_total(text):
-        if not isinstance(text, str):
-            return None
+def substance_history_row_count(data):
+    """Rows build_substance_history_frame makes from these records: one per table row below the header."""
+    return sum(len(record['substance_table']) - 1 for record in data if record['substance_table'])
 
-        match = re.search(r"Point Total:\s*\((\d+)\)", text)
-        if match:
-            return int(match.group(1))
-        return None
+def process_substance_history(input_folder, workers=None, cache_path=None, files=None, timings=None):
+    per_file = run_file_parser(parse_substance_history_pdf, input_folder, workers, cache_path, files, timings=timings)
+    with timed(timings, "frame"):
+        return build_substance_history_frame(flatten_records(per_file))
 
+##########################################
+# Writing Parser Outputs                 #
+##########################################
 
-    all_responses = []
-    group_ids = []  # <- Add this line
+# Parser type -> per-file parse function, frame builder, output file, the
+# columns that identify a row when new results are upserted into an output,
+# and the explicit column types used when writing Parquet
+PARSERS = {
+    "CARD": {
+        "label": "Daily Clinical Cards",
+        "parse_file": parse_clinical_card_pdf,
+        "build_frame": build_clinical_card_frame,
+        "output_file": "daily_clinical_card_summary.csv",
+        "date_columns": ["assessment_date"],
+        "dtypes": {"group_identifier": "category"},
+        "prefix_dtypes": {"emo_": "Int8", "sup_": "Int8", "cop_": "Int8"},
+    },
+    "PHP": {
+        "label": "PHP Daily Assessments",
+        "parse_file": parse_php_pdf,
+        "build_frame": build_php_frame,
+        "streaming": True,
+        "output_file": "extracted_php_assessments.csv",
+        "date_columns": ["assessment_date"],
+        "dtypes": {"group_identifier": "category", "Craving": "Int8",
+                   **{col: "bool" for col in list(emotion_keywords) + list(skills_keywords) + list(supports_keywords)}},
+    },
+    "BPS": {
+        "label": "Biopsychosocial Assessments",
+        "parse_file": parse_bps_pdf,
+        "build_frame": build_bps_frame,
+        "output_file": "bps_anonimized.csv",
+        "date_columns": ["assmt_dt", "birthdate"],
+        "dtypes": {"group_identifier": "category", "age": "Int16", "num_prev_treatments": "Int16",
+                   "drug_craving_score": "Int8", **{col: "Int16" for col in bps_columns[1:]}},
+    },
+    "SUB": {
+        "label": "Substance Abuse History",
+        "parse_file": parse_substance_history_pdf,
+        "build_frame": build_substance_history_frame,
+        "output_file": "patient_substance_history.csv",
+        "row_count": substance_history_row_count,
+        "dtypes": {"group_identifier": "category", "use_flag": "bool",
+                   "pattern_of_use_consolidated": "category"},
+    },
+    "AHCM": {
+        "label": "AHCM Survey",
+        "parse_file": parse_ahcm_pdf,
+        "build_frame": build_ahcm_frame,
+        "output_file": "ahcm_survey_output.csv",
+        "dtypes": {"group_identifier": "category"},
+    },
+}
 
-    for pdf_filename, df in all_pdf_data.items():
-        # Extract group_identifier from filename
-        match = re.search(r'_(LO-\d{4}-\d{1,3})_', pdf_filename.upper())
-        if match:
-            patient_id = match.group(1)
+OUTPUT_FORMATS = ("csv", "parquet")
+
+def output_file_for(parser_type, output_format):
+    base_name = os.path.splitext(PARSERS[parser_type]["output_file"])[0]
+    return f"{base_name}.{output_format}"
+
+def apply_output_dtypes(df, spec):
+    """
+    Casts a parser output to the explicit column types of its registry entry:
+    dates become timestamps, flags booleans, scores small nullable ints,
+    group_identifier a categorical, and any other text column a string.
+    """
+    df = df.copy()
+    for col in spec.get("date_columns", []):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format="%m/%d/%Y", errors="coerce")
+
+    dtypes = dict(spec.get("dtypes", {}))
+    for prefix, dtype in spec.get("prefix_dtypes", {}).items():
+        dtypes.update({col: dtype for col in df.columns if col.startswith(prefix)})
+    for col, dtype in dtypes.items():
+        if col not in df.columns:
+            continue
+        if dtype.startswith("Int"):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+        elif dtype == "bool" and df[col].dtype != bool:
+            df[col] = df[col].astype(str).str.lower().isin(["true", "1"])
         else:
-            patient_id = pdf_filename  # fallback
-        group_identifier = pseudonymize_function(patient_id)
-        group_ids.append(group_identifier) 
-
-        cleaned_questions = df['Question'].apply(clean_text).tolist()
-        cleaned_answers = df['Answer'].apply(clean_text).tolist()
-        all_responses.append(cleaned_answers)
-
-    final_df = pd.DataFrame(all_responses, columns=cleaned_questions)
-    final_df.insert(0, "group_identifier", group_ids) 
-
-    column_renames = {
-        'What is your living situation today?': 'living_situation',
-        'think about the place you live. Do you have problems with any of the following?': 'housing_problems',
-        """Within the past 12 months, you worried that your food would run out before you got money to buy more. " Sometimes true 4. Within the past 12 months, the food you bought just didn't last and you didn't have money to get more. " Sometimes true 5. In the past 12 months, has lack of reliable transportation kept you from medical appointments, mettings, work or from getting things needed for daily living?""": "food_insecurity_and_transport_issues",
-        'In the past 12 months has the electric, gas, oil, or water company threatened to shut off services in your home?': 'utility_shutoff_threat',
-        'How often does anyone, including family and friends, physically hurt you?': 'abuse_physical',
-        'How often does anyone, including family and friends, insult or talk down to you?': 'abuse_verbal',
-        'How often does anyone, including family and friends, threaten you with harm?': 'abuse_threats',
-        'How often does anyone, including family and friends, scream or curse at you?': 'abuse_yelling',
-        'How hard is it for you to pay for the very basics like food, housing, medical care, and heating?': 'financial_strain',
-        'Do you want help finding or keeping work or a job?': 'want_work_help',
-        'If for any reason you need help with day to day activities such as bathing, preparing meals, shopping, managing finances, etc., do you get the help you need?': 'need_daily_help',
-        'How often do you feel lonely or isolated from those around you?': 'feel_lonely',
-        'Do you speak a language other than English at home?': 'non_english_at_home',
-        'Do you want help with school or training?': 'want_school_help',
-        'In the last 30 days, other than the activities you did for work, on average, how many days per week did you engage in moderate exercise (like walking fast, running, jogging, dancing, swimming, biking, or other similar activities)?': 'exercise_days_per_week',
-        'On average, how many minutes did you usually spend exercising at this level on one of those days?': 'exercise_minutes_per_day',
-        'Calculate [<number of days= selected] x [<number of minutes= selected] = [number of minutes of exercise per week] 2. Apply the right age threshold: " Under 6 years old: You can9t find the physical activity need for people under 6. " Age 6 to 17: Less than an average of 60 minutes a day shows an HRSN. " Age 18 or older: Less than 150 minutes a week shows an HRSN. . Some of the substances are prescribed by a doctor (like pain medications), but only count those if you have taken them for reasons or in doses other than prescribed. One question is about illicit or illegal drug use, but we only ask in order to identify community services that may be available to help you. 19. How many times in the past 12 months have you had 5 or more drinks in a day (males) or 4 or more drinks in a day (females)?': 'binge_drinking',
-        'How many times in the past 12 months have you used tobacco products (like cigarettes, cigars, snuff, chew, electronic cigarettes)?': 'tobacco_use',
-        'How many times in the past year have you used prescription drugs for non medical reasons?': 'prescription_misuse',
-        'How many times in the past year have you used illegal drugs?': 'illegal_drug_use_count',
-        'Over the past 2 weeks, how often have you been bothered by any of the following problems?': 'mental_health_score',
-        'Stress means a situation in which a person feels tense, restless, nervous, or anxious, or is unable to sleep at night because his or her mind is troubled all the time. Do you feel this kind of stress these days?': 'current_stress',
-        'Because of a physical, mental or emotional condition, do you have serious difficulty concentrating, remembering or making decisions?': 'cognitive_difficulty',
-        'Because of a physical, mental or emotional condition, do you have difficulty doing errands alone such as visiting a doctor\'s office or shopping?': 'errand_difficulty',
-        'Shutoff Notice': 'shutoff_notice'
-    }
+            df[col] = df[col].astype(dtype)
 
-    final_df.rename(columns=column_renames, inplace=True)
-
-    final_df["living_situation"] = final_df["living_situation"].apply(clean_living_situation)
-    final_df["utility_shutoff_threat"] = final_df.get("utility_shutoff_threat", pd.Series()).apply(clean_yes_no_value)
-    final_df["abuse_yelling"] = final_df.get("abuse_yelling", pd.Series()).apply(extract_frequency_label)
-    final_df["abuse_physical"] = final_df.get("abuse_physical", pd.Series()).apply(extract_frequency_label)
-    final_df["abuse_verbal"] = final_df.get("abuse_verbal", pd.Series()).apply(extract_frequency_label)
-    final_df["abuse_threats"] = final_df.get("abuse_threats", pd.Series()).apply(extract_frequency_label)
-    final_df["financial_strain"] = final_df.get("financial_strain", pd.Series()).apply(clean_financial_strain)
-    final_df["binge_drinking"] = final_df.get("binge_drinking", pd.Series()).apply(extract_binge_frequency)
-    final_df["exercise_minutes_per_day"] = final_df.get("exercise_minutes_per_day", pd.Series()).apply(extract_max_minutes)
-    final_df["exercise_days_per_week"] = final_df.get("exercise_days_per_week", pd.Series()).apply(extract_max_minutes)
-    final_df["mental_health_score"] = final_df.get("mental_health_score", pd.Series()).apply(extract_point_total)
-    final_df["cognitive_difficulty"] = final_df.get("cognitive_difficulty", pd.Series()).apply(clean_yes_no_value)
-    final_df["errand_difficulty"] = final_df.get("errand_difficulty", pd.Series()).apply(clean_yes_no_value)
-
-    for col in final_df.columns:
-        final_df[col] = final_df[col].astype(str).str.lstrip(' " ').str.strip()
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].astype("string")
+    return df
 
-        # Replace internal quote-separated values with '//' delimiter
-        final_df.replace(to_replace=r' " ', value=' // ', regex=True, inplace=True)
+def write_output(df, out_file, spec, output_format):
+    if output_format == "parquet":
+        apply_output_dtypes(df, spec).to_parquet(out_file, index=False)
+    else:
+        df.to_csv(out_file, index=False)
+
+def read_output(out_file, output_format):
+    if output_format == "parquet":
+        return pd.read_parquet(out_file)
+    # Read everything back as text so unchanged rows are rewritten exactly
+    return pd.read_csv(out_file, dtype=str, keep_default_na=False)
+
+def row_count(spec, records):
+    """Rows the parser's build_frame makes from these records; one per record unless its registry entry says otherwise."""
+    return spec["row_count"](records) if "row_count" in spec else len(records)
+
+def run_parsers(parser_types, input_folders, output_folder, workers=None, cache_path=None,
+                incremental=False, output_format="csv", progress=None, all_cards=False, timings=None):
+    """
+    Runs one or more parsers over one or more input folders in a single pass.
+
+    Each folder is listed once and each PDF is opened once; every selected
+    parser reads the same loaded document. The manifest kept in the output
+    folder records which PDF every run of output rows came from. In
+    incremental mode only PDFs that are new or changed since the last run
+    are parsed; their rows replace the rows they gave before, and the rows
+    of PDFs no longer in the input folders are dropped. all_cards makes the
+    Daily Clinical Card parser keep every dated card in a file instead of
+    the first. When a RunTimings is given, per-file traces and the frame
+    building and writing time of each parser are recorded in it.
+    Returns {parser_type: output file}.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+    manifest = load_manifest(output_folder)
+    out_files = {t: os.path.join(output_folder, output_file_for(t, output_format)) for t in parser_types}
+    # Outputs missing from the manifest, written under an older manifest
+    # version or changed since, are rebuilt rather than updated
+    existing = {}
+    for t in parser_types:
+        if incremental and t in manifest and os.path.exists(out_files[t]):
+            existing_df = read_output(out_files[t], output_format)
+            if len(existing_df) == sum(rows for _, rows in manifest[t]["rows"]):
+                existing[t] = existing_df
+            else:
+                logging.info(f"{out_files[t]} no longer matches the manifest; rebuilding it")
+    records = {t: [] for t in parser_types}
+    new_runs = {t: [] for t in parser_types}
+    # Row-per-record outputs are written in chunks as files finish instead of
+    # being held in memory until the end
+    writers = {t: ChunkedCsvWriter(out_files[t], PARSERS[t]["build_frame"])
+               for t in parser_types
+               if PARSERS[t].get("streaming") and t not in existing and output_format == "csv"}
+    new_entries = {t: {} for t in parser_types}
+    parsed = set()
+    parse_files = tuple(parse_all_clinical_cards_pdf if t == "CARD" and all_cards else PARSERS[t]["parse_file"]
+                        for t in parser_types)
+    parse_all = partial(parse_with_all, parse_files)
+
+    for input_folder in input_folders:
+        filenames = list_pdf_files(input_folder)
+        to_parse = set()
+        for t in parser_types:
+            changed, entries = find_changed_files(input_folder, filenames, manifest.get(t, {}).get("files", {}))
+            new_entries[t].update(entries)
+            to_parse.update(changed if t in existing else filenames)
+        logging.info(f"{input_folder}: {len(to_parse)} of {len(filenames)} PDFs to parse")
+
+        to_parse = sorted(to_parse)
+        pdf_paths = [os.path.abspath(os.path.join(input_folder, filename)) for filename in to_parse]
+        parsed.update(pdf_paths)
+        per_file = iter_file_parser(parse_all, input_folder, workers, cache_path, to_parse, progress, timings)
+        for pdf_path, file_results in zip(pdf_paths, per_file):
+            for t, file_records in zip(parser_types, file_results):
+                rows = row_count(PARSERS[t], file_records)
+                if rows:
+                    new_runs[t].append([pdf_path, rows])
+                if t in writers:
+                    with timed(timings, f"write:{t}"):
+                        writers[t].add(file_records)
+                else:
+                    records[t].extend(file_records)
+
+    for t in parser_types:
+        spec = PARSERS[t]
+        runs = new_runs[t]
+        if t in writers:
+            with timed(timings, f"write:{t}"):
+                writers[t].close()
+        elif t in existing:
+            with timed(timings, f"frame:{t}"):
+                new_df = spec["build_frame"](records[t]) if records[t] else pd.DataFrame()
+                if output_format == "parquet" and records[t]:
+                    new_df = apply_output_dtypes(new_df, spec)
+                unchanged = set(new_entries[t]) - parsed
+                df, runs = upsert_file_rows(existing[t], manifest[t]["rows"], new_df, runs, unchanged)
+            if len(df) != len(existing[t]) or records[t]:
+                with timed(timings, f"write:{t}"):
+                    write_output(df, out_files[t], spec, output_format)
+        else:
+            with timed(timings, f"frame:{t}"):
+                df = spec["build_frame"](records[t])
+            with timed(timings, f"write:{t}"):
+                write_output(df, out_files[t], spec, output_format)
+        manifest[t] = {"files": new_entries[t], "rows": runs}
 
-        # Clean 'housing_problems' column: remove periods and trim whitespace
-        if 'housing_problems' in final_df.columns:
-            final_df['housing_problems'] = final_df['housing_problems'].str.replace('.', '', regex=False).str.strip()
+    save_manifest(output_folder, manifest)
+    return out_files
 
-    return final_df
-###############################################
-# Substance Abuse History Parser Definitions  #
-###############################################
+##########################################
+# Headless Command-Line Interface        #
+##########################################
 
-def process_substance_history(input_folder):
-    data = []
-    for filename in os.listdir(input_folder):
-            match = re.search(r'_(LO-\d{4}-\d{1,3})_', filename.upper())
-            if match:
-                patient_id = match.group(1)
-            else:
-                patient_id = filename  # fallback
-            group_identifier = pseudonymize_function(patient_id)
-            pdf_path = os.path.join(input_folder, filename)
-            
-            # Extract full text using PyMuPDF (if needed)
-            doc = fitz.open(pdf_path)
-            extracted_text = ""
-            for page_num in range(doc.page_count):
-                page = doc.load_page(page_num)
-                extracted_text += page.get_text("text")
-            
-            # Initialize placeholders for substance section extraction
-            found_substance_section = False
-            substance_tables = []
-            
-            # Search for the substance use section and extract tables using pdfplumber
-            with pdfplumber.open(pdf_path) as pdf:
-                for i, page in enumerate(pdf.pages):
-                    text = page.extract_text()
-                    if not found_substance_section and "IV. SUBSTANCE USE HISTORY & ASSESSMENT" in text:
-                        found_substance_section = True
-                    if found_substance_section:
-                        table = page.extract_table()
-                        if table:
-                            substance_tables.append(table)
-                        # Break once the next main section is detected (e.g., heading "V.")
-                        if "V." in text:
-                            break
-            
-            # Flatten all found tables
-            flat_table = []
-            for table in substance_tables:
-                flat_table.extend(table)
-            
-            result = {
-                "group_identifier": group_identifier,
-                "found_substance_section": found_substance_section,
-                "substance_table": flat_table if flat_table else None,
-            }
-            data.append(result)
-    
-    df = pd.DataFrame(data)
-    
-    # Flatten the table data into individual records
-    flattened_data = []
-    for index, row in df.iterrows():
-        group_identifier = row['group_identifier']
-        substance_table = row['substance_table']
-        if substance_table:
-            header = substance_table[0]  # assuming header is first row
-            for substance_row in substance_table[1:]:
-                substance_data = {
-                    "group_identifier": group_identifier,
-                    "substance": substance_row[0],  # Substance name
-                    "first_used": substance_row[1],
-                    "last_used": substance_row[2],
-                    "frequency_duration": substance_row[3],
-                    "amount": substance_row[4],
-                    "method": substance_row[5],
-                    "pattern_of_use": substance_row[6]
-                }
-                flattened_data.append(substance_data)
-    
-    if flattened_data:
-        flattened_df = pd.DataFrame(flattened_data)
-        # Create a flag based on whether first or last used fields are provided
-        flattened_df['use_flag'] = (
-            ((flattened_df['first_used'].notna() & (flattened_df['first_used'] != 'NA') & (flattened_df['first_used'].str.strip() != '')) |
-             (flattened_df['last_used'].notna() & (flattened_df['last_used'] != 'NA') & (flattened_df['last_used'].str.strip() != '')))
-            .astype(int)
-        )
-        sparse_df = flattened_df[['group_identifier','substance','use_flag','pattern_of_use']].copy()
-        
-        # Define mapping for consolidated categories for pattern of use
-        pattern_mapping = {
-            'continued': 'Continued',
-            'Continued': 'Continued',
-            'contunued': 'Continued',
-            'Binge, continued': 'Binge/Continued',
-            'Binge episodes': 'Binge/Episodic',
-            'binge/episodic': 'Binge/Episodic',
-            'episodic': 'Binge/Episodic',
-            'Episodic/binge': 'Binge/Episodic',
-            'Episodic or binge': 'Binge/Episodic',
-            'Binge': 'Binge/Episodic',
-            'Binges': 'Binge/Episodic',
-            'experimental': 'Experimental',
-            'social': 'Experimental',
-            'socially': 'Experimental',
-            'recreational': 'Experimental',
-            'recreationally': 'Experimental',
-            'daily': 'Daily',
-            'na': 'NA',
-            'NA': 'NA',
-            'N/A': 'NA',
-            'prescribed prn': 'Prescribed',
-            'as prescribed for sleep': 'Prescribed',
-            'for surgery': 'Prescribed',
-            'once in a while': 'Experimental',
-            'mental and emotional': 'Prescribed',
-            'ocationally': 'Occasionally',
-            'trail': 'Experimental'
-        }
-        sparse_df.loc[:, 'pattern_of_use_consolidated'] = sparse_df['pattern_of_use'].map(pattern_mapping).fillna(sparse_df['pattern_of_use'])
-        return sparse_df
-    else:
-        return pd.DataFrame()  # Return an empty DataFrame if no data was flattened
+def load_job_spec(job_path):
+    """
+    Reads a JSON job spec, for example:
+
+        {"parsers": ["PHP", "BPS"], "input_folders": ["/data/casefiles"],
+         "output_folder": "/data/out", "workers": 8, "output_format": "csv",
+         "cache_path": "/data/cache/extraction_cache.sqlite3", "incremental": true,
+         "all_cards": false, "timings": true, "trace_file": "/data/out/trace.jsonl",
+         "log_level": "INFO"}
+
+    A single "input_folder" string is accepted in place of "input_folders".
+    The extraction cache is only used when "cache_path" is set.
+    """
+    with open(job_path, "r") as f:
+        job = json.load(f)
+    if "input_folder" in job and "input_folders" not in job:
+        job["input_folders"] = [job.pop("input_folder")]
+    return job
+
+def print_progress(done, total, filename):
+    print(f"[{done}/{total}] {filename}", flush=True)
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description="Parse Kipu assessment PDFs without the GUI. Run with no arguments to open the GUI.")
+    arg_parser.add_argument("--job", help="JSON job spec; command-line options override its values")
+    arg_parser.add_argument("--parsers", nargs="+", choices=list(PARSERS), help="parser types to run")
+    arg_parser.add_argument("--input", nargs="+", dest="input_folders", help="folders containing PDF files")
+    arg_parser.add_argument("--output", dest="output_folder", help="folder to write outputs to")
+    arg_parser.add_argument("--workers", type=int, help="number of worker processes")
+    arg_parser.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS, help="output file format")
+    arg_parser.add_argument("--cache", dest="cache_path", nargs="?", const=DEFAULT_CACHE_PATH,
+                            help=f"reuse extracted PDF text from this cache file (default: {DEFAULT_CACHE_PATH}); "
+                                 "the cache holds patient text, so it is off unless asked for")
+    arg_parser.add_argument("--no-cache", action="store_true", help="do not use the extraction cache")
+    arg_parser.add_argument("--clear-cache", action="store_true",
+                            help="delete the extraction cache file (the --cache file, or the default one)")
+    arg_parser.add_argument("--incremental", action="store_true", default=None,
+                            help="only parse new or changed PDFs and update existing outputs")
+    arg_parser.add_argument("--all-cards", action="store_true", default=None,
+                            help="keep every dated Daily Clinical Card in a file, not just the first")
+    arg_parser.add_argument("--timings", action="store_true", default=None,
+                            help="print per-stage timings, throughput and the slowest files")
+    arg_parser.add_argument("--trace-file", help="write per-file timing traces to this JSON lines file")
+    arg_parser.add_argument("--log-level", type=str.upper, choices=LOG_LEVELS,
+                            help=f"logging level (default: {DEFAULT_LOG_LEVEL})")
+    args = arg_parser.parse_args(argv)
+
+    job = load_job_spec(args.job) if args.job else {}
+    for key in ["parsers", "input_folders", "output_folder", "workers", "output_format", "cache_path",
+                "incremental", "all_cards", "timings", "trace_file", "log_level"]:
+        if getattr(args, key) is not None:
+            job[key] = getattr(args, key)
+    if args.no_cache:
+        job["cache_path"] = None
+    if args.clear_cache:
+        deleted = delete_cache(args.cache_path or DEFAULT_CACHE_PATH)
+        print(f"Deleted {', '.join(deleted)}" if deleted else "No extraction cache to delete", flush=True)
+        if not job.get("parsers"):
+            return 0
+
+    if not job.get("parsers"):
+        arg_parser.error("no parsers selected")
+    unknown = [t for t in job["parsers"] if t not in PARSERS]
+    if unknown:
+        arg_parser.error(f"unknown parser types: {', '.join(unknown)}")
+    if not job.get("input_folders"):
+        arg_parser.error("no input folder given")
+    if not job.get("output_folder"):
+        arg_parser.error("no output folder given")
+    if str(job.get("log_level", DEFAULT_LOG_LEVEL)).upper() not in LOG_LEVELS:
+        arg_parser.error(f"unknown log level: {job['log_level']}")
+    setup_logging(job.get("log_level", DEFAULT_LOG_LEVEL))
+
+    os.makedirs(job["output_folder"], exist_ok=True)
+    timings = RunTimings() if job.get("timings") or job.get("trace_file") else None
+    print(f"Running {', '.join(job['parsers'])} on {', '.join(job['input_folders'])}", flush=True)
+    out_files = run_parsers(job["parsers"], job["input_folders"], job["output_folder"],
+                            workers=job.get("workers", os.cpu_count()),
+                            cache_path=job.get("cache_path"),
+                            incremental=job.get("incremental", False),
+                            output_format=job.get("output_format", "csv"),
+                            progress=print_progress,
+                            all_cards=job.get("all_cards", False),
+                            timings=timings)
+    for parser_type, out_file in out_files.items():
+        print(f"{PARSERS[parser_type]['label']} saved at: {out_file}", flush=True)
+    if job.get("timings"):
+        print(timings.summary(), flush=True)
+    if job.get("trace_file"):
+        timings.write_trace(job["trace_file"])
+        print(f"Timing trace saved at: {job['trace_file']}", flush=True)
+    return 0
 
 ##########################################
 # GUI and Parser Selection Functions     #
@@ -769,6 +1311,19 @@ def select_output_folder():
     else:
         output_label.config(text="Output: Not selected")
 
+def get_worker_count():
+    try:
+        return max(1, int(worker_selection.get()))
+    except (ValueError, tk.TclError):
+        return 1
+
+def get_cache_path():
+    return DEFAULT_CACHE_PATH if use_cache.get() else None
+
+def clear_cache():
+    deleted = delete_cache(DEFAULT_CACHE_PATH)
+    messagebox.showinfo("Extraction Cache", "Extraction cache deleted." if deleted else "There is no extraction cache to delete.")
+
 def run_selected_parser():
     if not input_path:
         messagebox.showwarning("No Input Selected", "Please select an input folder.")
@@ -778,54 +1333,24 @@ def run_selected_parser():
         return
 
     parser_type = parser_selection.get()
-    
-    if parser_type == "PHP":
-        try:
-            df = process_php_pdfs(input_path)
-            out_file = os.path.join(output_path, "extracted_php_assessments.csv")
-            df.to_csv(out_file, index=False)
-            messagebox.showinfo("Success", f"PHP Daily Assessments processed successfully!\nCSV saved at:\n{out_file}")
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred while processing PHP Daily Assessments:\n{str(e)}")
-    elif parser_type == "CARD":
-        try:
-            df = process_clinical_card_pdfs(input_path)
-            out_file = os.path.join(output_path, "daily_clinical_card_summary.csv")
-            df.to_csv(out_file, index=False)
-            messagebox.showinfo("Success", f"Daily Clinical Cards processed successfully!\nCSV saved at:\n{out_file}")
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred while processing Daily Clinical Cards:\n{str(e)}")
-    elif parser_type == "BPS":
-        try:
-            df = process_bps_pdfs(input_path)
-            out_file = os.path.join(output_path, "bps_anonimized.csv")
-            df.to_csv(out_file, index=False)
-            messagebox.showinfo("Success", f"Biopsychosocial Assessments processed successfully!\nCSV saved at:\n{out_file}")
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred while processing Biopsychosocial Assessments:\n{str(e)}")
-    elif parser_type == "SUB":
-        try:
-            df = process_substance_history(input_path)
-            out_file = os.path.join(output_path, "patient_substance_history.csv")
-            df.to_csv(out_file, index=False)
-            messagebox.showinfo("Success", f"Substance Abuse History processed successfully!\nCSV saved at:\n{out_file}")
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred while processing Substance Abuse History:\n{str(e)}")
-    elif parser_type == "AHCM":
-        try:
-            df = process_ahcm_pdfs(input_path)
-            out_file = os.path.join(output_path, "ahcm_survey_output.csv")
-            df.to_csv(out_file, index=False)
-            messagebox.showinfo("Success", f"AHCM Survey processed successfully!\nCSV saved at:\n{out_file}")
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred while processing AHCM Survey:\n{str(e)}")
-    else:
+    if parser_type not in PARSERS:
         messagebox.showwarning("No Parser Selected", "Please select a parser type.")
+        return
+
+    label = PARSERS[parser_type]["label"]
+    try:
+        out_file = run_parsers([parser_type], [input_path], output_path,
+                               workers=get_worker_count(), cache_path=get_cache_path(),
+                               incremental=incremental_mode.get(),
+                               output_format=output_format.get())[parser_type]
+        messagebox.showinfo("Success", f"{label} processed successfully!\nOutput saved at:\n{out_file}")
+    except Exception as e:
+        messagebox.showerror("Error", f"An error occurred while processing {label}:\n{str(e)}")
 
 def create_gui():
     root = tk.Tk()
     root.title("Assessment Parser")
-    root.geometry("500x360")
+    root.geometry("500x500")
     
     instructions = tk.Label(root, text="Select parser type and choose input/output folders", justify="center")
     instructions.pack(pady=10)
@@ -863,6 +1388,39 @@ def create_gui():
     output_label = tk.Label(root, text="Output: Not selected", fg="white", font=("Helvetica", 12))
     output_label.pack(pady=2)
     
+    # Number of worker processes used to parse PDFs in parallel
+    global worker_selection
+    worker_frame = tk.Frame(root)
+    worker_frame.pack(pady=5)
+    tk.Label(worker_frame, text="Worker processes:").pack(side="left")
+    worker_selection = tk.Spinbox(worker_frame, from_=1, to=os.cpu_count() or 1, width=4)
+    worker_selection.delete(0, "end")
+    worker_selection.insert(0, str(os.cpu_count() or 1))
+    worker_selection.pack(side="left")
+
+    # Reuse text already extracted from unchanged PDFs on earlier runs; off by
+    # default, since the cache keeps the patients' text on this computer
+    global use_cache
+    use_cache = tk.BooleanVar(value=False)
+    cache_frame = tk.Frame(root)
+    cache_frame.pack()
+    tk.Checkbutton(cache_frame, text="Cache extracted text to speed up later runs", variable=use_cache).pack(side="left")
+    tk.Button(cache_frame, text="Clear Cache", command=clear_cache).pack(side="left", padx=5)
+
+    # Only parse PDFs added or changed since the last run into this output folder
+    global incremental_mode
+    incremental_mode = tk.BooleanVar(value=False)
+    tk.Checkbutton(root, text="Only parse new or changed PDFs (update existing output)", variable=incremental_mode).pack()
+
+    # Output file format; Parquet keeps dates, flags and scores typed
+    global output_format
+    output_format = tk.StringVar(value="csv")
+    format_frame = tk.Frame(root)
+    format_frame.pack(pady=5)
+    tk.Label(format_frame, text="Output format:").pack(side="left")
+    for fmt in OUTPUT_FORMATS:
+        tk.Radiobutton(format_frame, text=fmt.upper(), variable=output_format, value=fmt).pack(side="left")
+
     # Run parser button
     run_button = tk.Button(root, text="Run Parser", command=run_selected_parser)
     run_button.pack(pady=20)
@@ -870,4 +1428,9 @@ def create_gui():
     root.mainloop()
 
 if __name__ == "__main__":
+    # Needed for the process pool when running as a frozen executable
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        sys.exit(main())
+    setup_logging()
     create_gui()
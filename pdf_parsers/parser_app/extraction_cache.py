@@ -0,0 +1,110 @@
+import json
+import os
+import sqlite3
+import time
+import zlib
+import fitz
+import pdfplumber
+
+# Bump whenever PdfDocument changes what it extracts, so stale entries are ignored
+EXTRACTION_VERSION = "1"
+PARSER_VERSION = f"{EXTRACTION_VERSION}-fitz{fitz.VersionBind}-pdfplumber{pdfplumber.__version__}"
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".exist_pdf_parsers", "extraction_cache.sqlite3")
+DEFAULT_MAX_BYTES = 1024 ** 3  # 1 GB of compressed entries
+
+# One open cache per process and path, so pool workers reuse their own
+# connection; a worker forked after the parent opened the cache must not use
+# the parent's, since SQLite connections cannot be shared across a fork
+_open_caches = {}
+
+
+def get_cache(cache_path, max_bytes=DEFAULT_MAX_BYTES):
+    key = (os.getpid(), cache_path)
+    if key not in _open_caches:
+        _open_caches[key] = ExtractionCache(cache_path, max_bytes)
+    return _open_caches[key]
+
+
+def delete_cache(cache_path=DEFAULT_CACHE_PATH):
+    """
+    Deletes the cache file at cache_path along with its SQLite journal files.
+    Returns the paths that were deleted.
+    """
+    for key in [key for key in _open_caches if key[1] == cache_path]:
+        _open_caches.pop(key).conn.close()
+    deleted = []
+    for path in [cache_path, cache_path + "-wal", cache_path + "-shm"]:
+        if os.path.exists(path):
+            os.remove(path)
+            deleted.append(path)
+    return deleted
+
+
+class ExtractionCache:
+    """
+    On-disk cache of extracted PDF page text and tables. The text is the
+    patients' records as written in the casefiles, so the cache is only used
+    when asked for, and its folder is created readable by its owner only.
+
+    Entries are keyed by the SHA-256 of the PDF content plus PARSER_VERSION and
+    stored as zlib-compressed JSON in SQLite. When the total stored size goes
+    over max_bytes, the least recently used entries are evicted. The database
+    is opened in WAL mode so several parser processes can share it.
+    """
+
+    def __init__(self, cache_path, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        self.conn = sqlite3.connect(cache_path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(content_hash):
+        return f"{content_hash}:{PARSER_VERSION}"
+
+    def get(self, content_hash):
+        key = self.make_key(content_hash)
+        row = self.conn.execute("SELECT data FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self.conn:
+            self.conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, content_hash, state):
+        key = self.make_key(content_hash)
+        blob = zlib.compress(json.dumps(state).encode("utf-8"))
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, data, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, blob, len(blob), time.time())
+            )
+        self.evict()
+
+    def evict(self):
+        """Drops least recently used entries until the cache fits in max_bytes."""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        to_delete = []
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            total -= size
+        with self.conn:
+            self.conn.executemany("DELETE FROM entries WHERE key = ?", to_delete)
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM entries")
@@ -0,0 +1,92 @@
+import re
+
+
+def trie_pattern(words):
+    """
+    Builds a regex alternation of the words shaped as a prefix tree, so the
+    engine never retries a shared prefix. Optional tails are greedy, which
+    makes the longest word win wherever several match at the same position.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Matches several keyword dictionaries against a text in one regex scan.
+
+    keyword_dicts maps a name to a {category: [words]} dictionary, like the
+    emotion, skill and support keywords of the PHP parser. A word counts as
+    found when it appears between word boundaries, ignoring case, exactly as
+    re.search(rf"\\b{word}\\b", text, re.IGNORECASE) would report it.
+
+    All words go into a single prefix-tree alternation inside a lookahead, so
+    matches starting at every position are seen. At any position the scan
+    reports the longest word that matches; shorter words that would also
+    match there (such as "opposite" inside "opposite action") are added from
+    a table built once here.
+    """
+
+    def __init__(self, keyword_dicts):
+        self.keyword_dicts = keyword_dicts
+
+        # lowercase word -> [(dict name, category, word as written)]
+        self._owners = {}
+        for name, keywords in keyword_dicts.items():
+            for category, words in keywords.items():
+                for word in words:
+                    self._owners.setdefault(word.lower(), []).append((name, category, word))
+
+        words = sorted(self._owners, key=len, reverse=True)
+        self._pattern = re.compile(rf"(?=\b({trie_pattern(words)})\b)", re.IGNORECASE)
+
+        # Words that also match wherever a longer word matches at the same position
+        self._implied = {}
+        for word in words:
+            self._implied[word] = [
+                other for other in words
+                if len(other) < len(word) and re.match(rf"{re.escape(other)}\b", word)
+            ]
+
+    def find_words(self, text):
+        """Returns the set of lowercase keywords found anywhere in the text."""
+        found = set()
+        for match in self._pattern.finditer(text):
+            word = match.group(1).lower()
+            if word not in found:
+                found.add(word)
+                found.update(self._implied[word])
+        return found
+
+    def match(self, text):
+        """
+        Returns {name: (hits, matched_words)} for every keyword dictionary,
+        where hits maps each category to True/False in dictionary order and
+        matched_words is the comma-separated string of the words found.
+        """
+        found = self.find_words(text)
+        found_by_name = {name: [] for name in self.keyword_dicts}
+        for word in found:
+            for name, category, original in self._owners[word]:
+                found_by_name[name].append((category, original))
+
+        results = {}
+        for name, keywords in self.keyword_dicts.items():
+            hit_categories = {category for category, _ in found_by_name[name]}
+            hits = {category: category in hit_categories for category in keywords}
+            matched_words = [original for _, original in found_by_name[name]]
+            results[name] = (hits, ", ".join(set(matched_words)))
+        return results
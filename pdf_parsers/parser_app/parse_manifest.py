@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+
+MANIFEST_FILENAME = "parser_manifest.json"
+
+# Bump when a parser change means earlier output rows should all be rebuilt
+MANIFEST_VERSION = "3"
+
+
+def load_manifest(output_folder):
+    """
+    Returns {parser_type: {"files": {pdf_path: {"mtime", "size", "hash"}},
+    "rows": [[pdf_path, row_count], ...]}} for an output folder. "rows" lists
+    the PDF each run of the output's rows came from, in output order.
+    """
+    manifest_file = os.path.join(output_folder, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("parsers", {})
+
+
+def save_manifest(output_folder, manifest):
+    manifest_file = os.path.join(output_folder, MANIFEST_FILENAME)
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump({"version": MANIFEST_VERSION, "parsers": manifest}, f, indent=2)
+    os.replace(tmp_file, manifest_file)
+
+
+def hash_file(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def find_changed_files(input_folder, filenames, entries):
+    """
+    Compares the PDFs in a folder against the manifest entries of one parser.
+
+    A file whose mtime and size are unchanged is trusted without hashing;
+    otherwise its content hash decides whether it really changed. Returns the
+    filenames that need parsing and the refreshed manifest entries.
+    """
+    changed = []
+    new_entries = {}
+    for filename in filenames:
+        pdf_path = os.path.abspath(os.path.join(input_folder, filename))
+        stat = os.stat(pdf_path)
+        previous = entries.get(pdf_path)
+        if previous and previous["mtime"] == stat.st_mtime and previous["size"] == stat.st_size:
+            new_entries[pdf_path] = previous
+            continue
+
+        content_hash = hash_file(pdf_path)
+        new_entries[pdf_path] = {"mtime": stat.st_mtime, "size": stat.st_size, "hash": content_hash}
+        if not previous or previous["hash"] != content_hash:
+            changed.append(filename)
+    return changed, new_entries
+
+
+def upsert_file_rows(existing_df, existing_runs, new_df, new_runs, unchanged):
+    """
+    Keeps the rows of existing_df that came from the PDFs in unchanged and
+    appends new_df, so the rows of changed PDFs are replaced and the rows of
+    PDFs that are gone are dropped. existing_runs and new_runs give the PDF
+    of each run of rows of their frame, as in the manifest. Returns the
+    updated frame and its runs.
+    """
+    kept = [path in unchanged for path, _ in existing_runs]
+    keep = np.repeat(kept, [rows for _, rows in existing_runs]).astype(bool)
+    runs = [run for run, keep_run in zip(existing_runs, kept) if keep_run] + new_runs
+    if new_df.empty:
+        return existing_df[keep].reset_index(drop=True), runs
+    if not keep.any():
+        return new_df, runs
+    return pd.concat([existing_df[keep], new_df], ignore_index=True), runs
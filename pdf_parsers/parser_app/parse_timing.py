@@ -0,0 +1,105 @@
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class StageTimer:
+    """Accumulates wall time, in seconds, under named stages."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+
+def timed(timer, name):
+    """timer.stage(name), or a no-op context when no timer is given."""
+    return timer.stage(name) if timer is not None else nullcontext()
+
+
+def percentile(values, pct):
+    """Linearly interpolated percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = (len(values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+class RunTimings:
+    """
+    Collects the timing traces of one parser run.
+
+    Every parsed PDF contributes a file trace built by parse_pdf_file: its
+    bytes read, page count, whether it came from the extraction cache, and
+    the seconds spent per stage (reading the file, cache lookups, opening the
+    document, loading its pages, fitz text, pdfplumber text and tables,
+    closing the document, and the regex field extraction that remains). Work done once per run, such as building the
+    DataFrames and writing outputs, is timed under run stages.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.files = []
+        self.run_timer = StageTimer()
+
+    def add_file(self, trace):
+        self.files.append(trace)
+
+    def stage(self, name):
+        return self.run_timer.stage(name)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def stage_names(self):
+        names = []
+        for trace in self.files:
+            names.extend(name for name in trace["stages"] if name not in names)
+        return names
+
+    def summary(self, slowest=5):
+        """Human-readable report: throughput, p50/p95 per stage and the slowest files."""
+        elapsed = self.elapsed
+        total_bytes = sum(trace["bytes"] for trace in self.files)
+        total_pages = sum(trace["pages"] for trace in self.files)
+        cached = sum(trace["cached"] for trace in self.files)
+        lines = [
+            f"Parsed {len(self.files)} PDFs ({total_bytes / 1e6:.1f} MB, {total_pages} pages, "
+            f"{cached} from cache) in {elapsed:.2f}s: {len(self.files) / elapsed:.1f} files/s, "
+            f"{total_bytes / 1e6 / elapsed:.2f} MB/s, {total_pages / elapsed:.0f} pages/s",
+            f"{'stage':<16}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}",
+        ]
+        for name in self.stage_names() + ["total"]:
+            if name == "total":
+                values = [trace["seconds"] for trace in self.files]
+            else:
+                values = [trace["stages"].get(name, 0.0) for trace in self.files]
+            lines.append(f"{name:<16}{sum(values):>10.2f}"
+                         f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}")
+
+        if self.run_timer.stages:
+            lines.append("Run stages: " + ", ".join(
+                f"{name} {seconds:.2f}s" for name, seconds in self.run_timer.stages.items()))
+
+        if self.files and slowest:
+            lines.append("Slowest files:")
+            for trace in sorted(self.files, key=lambda t: t["seconds"], reverse=True)[:slowest]:
+                lines.append(f"  {trace['seconds']:8.3f}s  {trace['file']} ({trace['pages']} pages)")
+        return "\n".join(lines)
+
+    def write_trace(self, trace_file):
+        """Writes one JSON object per line: every file trace, then the run stages."""
+        with open(trace_file, "w") as f:
+            for trace in self.files:
+                f.write(json.dumps({"type": "file", **trace}) + "\n")
+            f.write(json.dumps({"type": "run", "seconds": self.elapsed, "stages": self.run_timer.stages}) + "\n")
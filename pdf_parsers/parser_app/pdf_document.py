@@ -0,0 +1,142 @@
+import hashlib
+import io
+import os
+import fitz
+import pdfplumber
+from parse_timing import StageTimer
+
+
+class PdfDocument:
+    """
+    A PDF that is read from disk once and shared by every field extractor.
+
+    Page text comes from fitz and is extracted at most once per page.
+    pdfplumber is only opened, from the same in-memory bytes, the first time
+    a parser asks for tables or pdfplumber-flavoured text, and its results are
+    kept per page as well.
+
+    When an ExtractionCache is given, everything extracted is looked up by the
+    content hash of the file first and written back on close, so an unchanged
+    PDF is never opened by fitz or pdfplumber again.
+
+    The wall time spent reading, looking up the cache, opening the document,
+    loading its pages, extracting fitz text, pdfplumber text and tables, and
+    closing it again is accumulated per stage in self.timer.
+    """
+
+    def __init__(self, pdf_path, cache=None):
+        self.path = pdf_path
+        self.filename = os.path.basename(pdf_path)
+        self.timer = StageTimer()
+        with self.timer.stage("read"):
+            with open(pdf_path, "rb") as f:
+                self.data = f.read()
+            self.content_hash = hashlib.sha256(self.data).hexdigest()
+        self.cache = cache
+        self._fitz_doc = None
+        self._plumber_pdf = None
+        self._dirty = False
+
+        cached = None
+        if cache is not None:
+            with self.timer.stage("cache"):
+                cached = cache.get(self.content_hash)
+        self.from_cache = cached is not None
+        if cached is not None:
+            self.page_count = cached["page_count"]
+            self._page_texts = cached["page_texts"]
+            self._plumber_texts = {int(k): v for k, v in cached["plumber_texts"].items()}
+            self._page_tables = {int(k): v for k, v in cached["page_tables"].items()}
+            self._page_table = {int(k): v for k, v in cached["page_table"].items()}
+        else:
+            self.page_count = self._fitz().page_count
+            self._page_texts = [None] * self.page_count
+            self._plumber_texts = {}
+            self._page_tables = {}
+            self._page_table = {}
+            self._dirty = cache is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._dirty:
+            with self.timer.stage("cache"):
+                self.cache.put(self.content_hash, {
+                    "page_count": self.page_count,
+                    "page_texts": self._page_texts,
+                    "plumber_texts": self._plumber_texts,
+                    "page_tables": self._page_tables,
+                    "page_table": self._page_table,
+                })
+            self._dirty = False
+        # pdfplumber flushes the cache of every loaded page on close
+        with self.timer.stage("close"):
+            if self._fitz_doc is not None:
+                self._fitz_doc.close()
+                self._fitz_doc = None
+            if self._plumber_pdf is not None:
+                self._plumber_pdf.close()
+                self._plumber_pdf = None
+
+    def _fitz(self):
+        if self._fitz_doc is None:
+            with self.timer.stage("open"):
+                self._fitz_doc = fitz.open(stream=self.data, filetype="pdf")
+        return self._fitz_doc
+
+    def _plumber_page(self, page_num):
+        if self._plumber_pdf is None:
+            with self.timer.stage("open"):
+                self._plumber_pdf = pdfplumber.open(io.BytesIO(self.data))
+        # pdfplumber parses every page object the first time pages is read
+        with self.timer.stage("page_load"):
+            return self._plumber_pdf.pages[page_num]
+
+    def page_text(self, page_num):
+        """fitz text of a single page."""
+        if self._page_texts[page_num] is None:
+            doc = self._fitz()
+            with self.timer.stage("page_load"):
+                page = doc.load_page(page_num)
+            with self.timer.stage("fitz_text"):
+                self._page_texts[page_num] = page.get_text("text")
+            self._dirty = self.cache is not None
+        return self._page_texts[page_num]
+
+    @property
+    def page_texts(self):
+        return [self.page_text(page_num) for page_num in range(self.page_count)]
+
+    def full_text(self, separator=""):
+        return separator.join(self.page_texts)
+
+    def plumber_text(self, page_num):
+        """pdfplumber text of a single page, for parsers tuned to its layout."""
+        if page_num not in self._plumber_texts:
+            page = self._plumber_page(page_num)
+            with self.timer.stage("plumber_text"):
+                self._plumber_texts[page_num] = page.extract_text()
+            self._dirty = self.cache is not None
+        return self._plumber_texts[page_num]
+
+    def tables(self, page_num):
+        """All tables on a page, as returned by pdfplumber's extract_tables."""
+        if page_num not in self._page_tables:
+            page = self._plumber_page(page_num)
+            with self.timer.stage("plumber_tables"):
+                self._page_tables[page_num] = page.extract_tables()
+            self._dirty = self.cache is not None
+        return self._page_tables[page_num]
+
+    def table(self, page_num):
+        """The largest table on a page, as returned by pdfplumber's extract_table."""
+        if page_num not in self._page_table:
+            page = self._plumber_page(page_num)
+            with self.timer.stage("plumber_tables"):
+                self._page_table[page_num] = page.extract_table()
+            self._dirty = self.cache is not None
+        return self._page_table[page_num]
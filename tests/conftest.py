@@ -0,0 +1,9 @@
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The apps are flat scripts run from their own folders; put those folders on
+# the path so the tests import them the same way
+for folder in ["common", os.path.join("pdf_parsers", "parser_app"), "data_wrangling", "benchmarks"]:
+    sys.path.insert(0, os.path.join(REPO_DIR, folder))
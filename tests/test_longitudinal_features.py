@@ -0,0 +1,38 @@
+import pandas as pd
+from statistical_dataset_builder import build_longitudinal_features
+
+
+def scores(rows):
+    return pd.DataFrame(rows, columns=['group_identifier', 'assessment_date', 'score']).assign(
+        assessment_date=lambda df: pd.to_datetime(df['assessment_date']))
+
+
+def test_readmission_with_ongoing_latest_stay():
+    programs = pd.DataFrame({
+        'group_identifier': ['a', 'a', 'b'],
+        'admission_dt': ['2024-01-01', '2024-03-01', '2024-01-01'],
+        'discharge_dt': ['2024-01-21', None, '2024-01-11'],
+        'program': ['PHP', 'IOP', 'PHP'],
+        'discharge_type': ['Completed', None, 'Completed'],
+    })
+    scored = {'GAD': scores([('a', '2024-01-02', 10), ('a', '2024-02-01', 2),
+                             ('a', '2024-03-05', 8), ('a', '2024-04-01', 4),
+                             ('b', '2024-01-02', 9), ('b', '2024-01-10', 6)])}
+
+    patients = build_longitudinal_features(scored, programs).set_index('group_identifier')
+
+    readmitted = patients.loc['a']
+    assert readmitted['stays'] == 2
+    assert readmitted['program'] == 'IOP'
+    assert pd.isna(readmitted['discharge_dt'])
+    assert pd.isna(readmitted['discharge_type'])
+    assert readmitted['admission_dt'] == '2024-01-01'
+    assert readmitted['days_in_program'] == 20
+    # The score between the stays is left out; the ongoing stay counts up to the latest score
+    assert readmitted['GAD_change'] == 4 - 10
+
+    finished = patients.loc['b']
+    assert finished['stays'] == 1
+    assert finished['discharge_dt'] == '2024-01-11'
+    assert finished['discharge_type'] == 'Completed'
+    assert finished['GAD_change'] == 6 - 9
@@ -0,0 +1,38 @@
+import time
+import fitz
+import pdfplumber
+from exist_pdf_parsers import parse_pdf_file, parse_substance_history_pdf
+from synthetic_casefiles import make_casefiles
+
+PAGE_LOAD_DELAY = 0.05
+
+
+def slow_page_loads(monkeypatch):
+    """Makes every fitz and pdfplumber page load take at least PAGE_LOAD_DELAY."""
+    load_page = fitz.Document.load_page
+    pages = pdfplumber.pdf.PDF.pages
+
+    def slow_load_page(self, *args, **kwargs):
+        time.sleep(PAGE_LOAD_DELAY)
+        return load_page(self, *args, **kwargs)
+
+    def slow_pages(self):
+        time.sleep(PAGE_LOAD_DELAY)
+        return pages.fget(self)
+
+    monkeypatch.setattr(fitz.Document, "load_page", slow_load_page)
+    monkeypatch.setattr(pdfplumber.pdf.PDF, "pages", property(slow_pages))
+
+
+def test_page_loads_are_not_counted_as_field_extraction(tmp_path, monkeypatch):
+    pdf_path = make_casefiles(str(tmp_path), files=1, php_days=1, note_pages=1)[0]
+    slow_page_loads(monkeypatch)
+
+    # The substance history parser reads fitz text to find its section, then pdfplumber tables
+    records, trace = parse_pdf_file(parse_substance_history_pdf, None, pdf_path, "group")
+
+    assert records and records[0]["substance_table"]
+    stages = trace["stages"]
+    assert stages["page_load"] >= 2 * PAGE_LOAD_DELAY
+    assert stages["plumber_tables"] > 0
+    assert stages["fields"] < PAGE_LOAD_DELAY